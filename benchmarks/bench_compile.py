@@ -0,0 +1,67 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_compile.py
+
+"""Compares compiling figures from scratch with compiling them against the
+precompiled preamble.
+
+Usage: python benchmarks/bench_compile.py [figures]
+"""
+
+import os
+import sys
+import time
+
+from pubplot import Document
+from pubplot.document_classes import ieee_infocom
+from pubplot.latex import compile_pgf, get_pgf_compiler, temporary_directory
+
+
+def main():
+    figures = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    doc = Document(ieee_infocom)
+    fig, ax = doc.subfigures()
+    ax.plot([1, 2, 3], [1, 4, 9])
+
+    with temporary_directory() as temp_dir:
+        pgf_path = os.path.join(temp_dir, 'figure.pgf')
+        pdf_path = os.path.join(temp_dir, 'figure.pdf')
+        texsystem, preamble = fig._print_pgf(pgf_path)
+
+        start = time.perf_counter()
+        for _ in range(figures):
+            compile_pgf(pgf_path, pdf_path, texsystem, preamble)
+        scratch = time.perf_counter() - start
+
+        compiler = get_pgf_compiler(texsystem, preamble)
+        start = time.perf_counter()
+        compiler.format_dir()
+        dump = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(figures):
+            compiler.compile(pgf_path, pdf_path)
+        precompiled = time.perf_counter() - start
+
+    print('{} figures'.format(figures))
+    print('from scratch:       {:.3f}s'.format(scratch))
+    print('format dump:        {:.3f}s'.format(dump))
+    print('precompiled format: {:.3f}s ({:.1f}x)'.format(
+        precompiled, scratch / precompiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_decimation.py
+
+"""Measures pgf output size and drawing time of dense line plots with and
+without decimation.
+
+Usage: python benchmarks/bench_decimation.py [points]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from pubplot import Document
+from pubplot.document_classes import ieee_infocom
+
+
+def bench(points, decimate):
+    doc = Document(ieee_infocom, {'pubplot.decimate': decimate})
+    fig, ax = doc.subfigures()
+    x = np.linspace(0, 1, points)
+    y = np.sin(300 * x) + np.random.rand(points) * 0.1
+    start = time.perf_counter()
+    ax.plot(x, y)
+    pgf = fig.render('pgf')
+    return len(pgf), time.perf_counter() - start
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print('{:<12}{:>14}{:>10}'.format('decimate', 'pgf (bytes)', 'time (s)'))
+    for decimate in (False, True):
+        size, elapsed = bench(points, decimate)
+        print('{:<12}{:>14}{:>10.2f}'.format(str(decimate), size, elapsed))
+
+
+if __name__ == '__main__':
+    main()
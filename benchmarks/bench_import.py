@@ -0,0 +1,70 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_import.py
+
+"""Measures the cost of ``import pubplot`` and reports heavy modules.
+
+Creating a Document only needs the document class sizes, so matplotlib,
+numpy and the pgf backend must not be imported until a figure is created.
+Exits with a non-zero status if any of them is loaded. pylatex is loaded by
+``pubplot.document_classes``, whose packages are pylatex objects.
+
+Usage: python benchmarks/bench_import.py [runs]
+"""
+
+import subprocess
+import sys
+
+HEAVY_MODULES = ('matplotlib', 'matplotlib.backends.backend_pgf', 'numpy')
+
+SNIPPET = '''
+import sys
+import pubplot
+from pubplot.document_classes import ieee_infocom
+pubplot.Document(ieee_infocom).columnwidth
+print(' '.join(m for m in {!r} if m in sys.modules))
+'''.format(HEAVY_MODULES)
+
+
+def import_time():
+    """Returns the cumulative import time of pubplot in microseconds and the
+    heavy modules loaded by the snippet."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             SNIPPET],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'pubplot':
+            total = int(fields[1].split(':')[-1])
+    return total, result.stdout.split()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = [import_time() for _ in range(runs)]
+    best = min(total for total, _ in results)
+    loaded = results[0][1]
+    print('import pubplot: {:.1f} ms'.format(best / 1000))
+    print('heavy modules: {}'.format(', '.join(loaded) or 'none'))
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_probe.py
+
+"""Compares the fast LaTeX probe with the pylatex-based probe.
+
+Usage: python benchmarks/bench_probe.py [repetitions]
+"""
+
+import sys
+import timeit
+
+from pubplot import document_classes
+from pubplot.latex import probe_document_sizes, probe_document_sizes_pylatex
+
+CLASSES = ['ieee_infocom', 'ieee_jrnl', 'acm_sigconf', 'usenix']
+
+
+def bench(probe, document_class, repetitions):
+    return min(timeit.repeat(lambda: probe(document_class), number=1,
+                             repeat=repetitions))
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print('{:<16}{:>12}{:>12}{:>10}'.format('class', 'pylatex (s)',
+                                            'fast (s)', 'speedup'))
+    for name in CLASSES:
+        document_class = getattr(document_classes, name)
+        slow = bench(probe_document_sizes_pylatex, document_class,
+                     repetitions)
+        fast = bench(probe_document_sizes, document_class, repetitions)
+        print('{:<16}{:>12.3f}{:>12.3f}{:>9.1f}x'.format(name, slow, fast,
+                                                         slow / fast))
+
+
+if __name__ == '__main__':
+    main()
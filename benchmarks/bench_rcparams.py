@@ -0,0 +1,69 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_rcparams.py
+
+"""Measures the overhead pubplot adds to every PubAxes method call.
+
+Usage: python benchmarks/bench_rcparams.py [calls]
+"""
+
+import sys
+import timeit
+
+import matplotlib as mpl
+
+from pubplot import Document
+from pubplot.document_classes import ieee_infocom
+from pubplot.helpers import RCParams, rc_context
+from pubplot.styles import dichromatic
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    doc = Document(ieee_infocom, dichromatic())
+    fig, ax = doc.subfigures()
+    ax.get_label()  # creates the lazy axes
+    raw_ax = ax.obj
+    rc = RCParams(doc.style)
+
+    def raw_call():
+        raw_ax.get_label()
+
+    def validating_context():
+        with mpl.rc_context(rc=rc.get_rc_to_function('get_label')):
+            raw_ax.get_label()
+
+    def prevalidated_context():
+        with rc_context(rc.get_validated_rc('get_label')):
+            raw_ax.get_label()
+
+    def wrapped_call():
+        ax.get_label()
+
+    baseline = min(timeit.repeat(raw_call, number=calls, repeat=5)) / calls
+    print('{:<32}{:>12}'.format('', 'us/call'))
+    for name, func in [('matplotlib (no rc)', raw_call),
+                       ('mpl.rc_context (validating)', validating_context),
+                       ('pubplot rc_context', prevalidated_context),
+                       ('PubAxes method', wrapped_call)]:
+        t = min(timeit.repeat(func, number=calls, repeat=5)) / calls
+        print('{:<32}{:>12.2f}{:>12}'.format(
+            name, t * 1e6, '+{:.2f}'.format((t - baseline) * 1e6)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_session.py
+
+"""Compares wrapped PubAxes calls with calls made inside a session.
+
+Usage: python benchmarks/bench_session.py [calls]
+"""
+
+import sys
+import timeit
+
+from pubplot import Document
+from pubplot.document_classes import ieee_infocom
+from pubplot.styles import dichromatic
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    doc = Document(ieee_infocom, dichromatic())
+    fig, ax = doc.subfigures()
+
+    def wrapped():
+        for i in range(calls):
+            ax.set_label(i)
+
+    def wrapped_in_session():
+        with ax.session():
+            for i in range(calls):
+                ax.set_label(i)
+
+    def raw_in_session():
+        with ax.session() as raw_ax:
+            for i in range(calls):
+                raw_ax.set_label(i)
+
+    print('{:<24}{:>12}'.format('', 'us/call'))
+    for name, func in [('wrapped', wrapped),
+                       ('wrapped in session', wrapped_in_session),
+                       ('raw in session', raw_in_session)]:
+        t = min(timeit.repeat(func, number=1, repeat=5)) / calls
+        print('{:<24}{:>12.2f}'.format(name, t * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# bench_wrappers.py
+
+"""Measures time and memory allocated by wrapped method calls on a grid of
+subplots.
+
+Usage: python benchmarks/bench_wrappers.py [calls_per_panel]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from pubplot import Document
+from pubplot.document_classes import ieee_infocom
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    doc = Document(ieee_infocom)
+    fig, axes = doc.subfigures(10, 10)
+    for ax in axes:
+        ax.get_label()  # creates the lazy axes
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for ax in axes:
+        for i in range(calls):
+            ax.set_label(i)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_calls = len(axes) * calls
+    wrapper_size = sum(sys.getsizeof(ax) +
+                       sys.getsizeof(getattr(ax, '__dict__', None))
+                       for ax in axes) / len(axes)
+    print('calls:                 {}'.format(total_calls))
+    print('time per call:         {:.2f} us'.format(elapsed / total_calls * 1e6))
+    print('traced memory:         {:.1f} KiB (peak {:.1f} KiB)'.format(
+        current / 1024, peak / 1024))
+    print('PubAxes instance size: {:.0f} bytes'.format(wrapper_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,33 @@
 #
 # __init__.py
 
-from pubplot.document import Document
-import pubplot.document_classes
+import importlib
+
+# Document and the submodules are imported on first use, so that importing
+# pubplot does not load matplotlib (PEP 562)
+_LAZY_ATTRIBUTES = {'Document': 'pubplot.document'}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif not name.startswith('_'):
+        try:
+            value = importlib.import_module('pubplot.' + name)
+        except ModuleNotFoundError as e:
+            if e.name != 'pubplot.' + name:
+                raise
+            raise AttributeError(
+                "module 'pubplot' has no attribute {!r}".format(name))
+    else:
+        raise AttributeError(
+            "module 'pubplot' has no attribute {!r}".format(name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
 
 __author__ = 'Hugo Sadok'
 __email__ = 'hugo@sadok.com.br'
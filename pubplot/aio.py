@@ -0,0 +1,140 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# aio.py
+
+import asyncio
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from pubplot import cache
+from pubplot import latex
+from pubplot.figure import SaveRequest
+from pubplot.size_tables import get_precomputed_sizes
+
+# matplotlib is not thread-safe, all drawing happens in this single thread;
+# wrapped calls made meanwhile from the event loop do not wait for it, and
+# apply their rcParams on top of the ones of the figure being drawn (see
+# pubplot.helpers.rc_context)
+_mpl_executor = ThreadPoolExecutor(max_workers=1)
+
+
+async def get_document_sizes_async(document_class, use_cache=True):
+    """Coroutine version of ``pubplot.latex.get_document_sizes``."""
+    if use_cache and cache.cache_enabled():
+        sizes_dict = latex.load_cached_sizes(document_class)
+        if sizes_dict is not None:
+            return sizes_dict
+    sizes_dict = await _probe_document_sizes_async(document_class)
+    if use_cache:
+        latex.store_cached_sizes(document_class, sizes_dict)
+    return sizes_dict
+
+
+async def _probe_document_sizes_async(document_class):
+    loop = asyncio.get_running_loop()
+    if not latex.SizeProbe.supports(document_class):
+        return await loop.run_in_executor(
+            None, latex.probe_document_sizes_pylatex, document_class)
+
+    with latex.SizeProbe(document_class) as probe:
+        process = await asyncio.create_subprocess_exec(
+            *probe.command, cwd=probe.directory,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        try:
+            async for line in process.stdout:
+                if probe.feed(line):
+                    break
+        finally:
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+
+    return probe.sizes
+
+
+async def create_document(cls, document_class, style=None,
+                          verify_sizes=False):
+    """Coroutine version of the ``Document`` constructor."""
+    sizes = get_precomputed_sizes(document_class)
+    if sizes is None or verify_sizes:
+        measured = await get_document_sizes_async(
+            document_class, use_cache=not verify_sizes)
+        sizes = cls._checked_sizes(sizes, measured)
+    doc = cls.__new__(cls)
+    doc._init(document_class, sizes, style)
+    return doc
+
+
+async def save_figure(fig, name, pdf=True, pgf=True, incremental=False,
+                      close=False):
+    """Coroutine version of ``PubFigure.save``."""
+    saved = await _save_or_skip(fig, name, pdf, pgf, incremental)
+    if close:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_mpl_executor, fig.close)
+    return saved
+
+
+async def _save_or_skip(fig, name, pdf, pgf, incremental):
+    # see PubFigure._save
+    loop = asyncio.get_running_loop()
+    if not pdf and not pgf:
+        return False
+    request = SaveRequest(name, pdf, pgf, incremental)
+    fingerprint = None
+    if incremental:
+        fingerprint = await loop.run_in_executor(_mpl_executor,
+                                                 fig.fingerprint)
+    if request.skip(fingerprint):
+        return False
+
+    if request.pgf_stream is not None:
+        await loop.run_in_executor(_mpl_executor, fig._print_pgf,
+                                   request.pgf_stream)
+    else:
+        with latex.temporary_directory() as temp_dir:
+            pgf_path = request.pgf_path(temp_dir)
+            texsystem, preamble = await loop.run_in_executor(
+                _mpl_executor, fig._print_pgf, pgf_path)
+            request.write_pgf(pgf_path)
+            pdf_path = request.pdf_path(temp_dir)
+            if pdf_path is not None:
+                await _compile_pgf(pgf_path, pdf_path, texsystem, preamble)
+                request.write_pdf(pdf_path)
+    request.finish()
+    return True
+
+
+async def _compile_pgf(pgf_path, pdf_path, texsystem, preamble):
+    # see PgfCompiler.compile
+    loop = asyncio.get_running_loop()
+    compiler = latex.get_pgf_compiler(texsystem, preamble)
+    with latex.temporary_directory() as temp_dir:
+        # creating the format runs LaTeX, only the first save pays for it
+        command, env = await loop.run_in_executor(
+            None, compiler.prepare, temp_dir, pgf_path)
+        process = await asyncio.create_subprocess_exec(
+            *command, cwd=temp_dir, env=env,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        output, _ = await process.communicate()
+        if compiler.finish(temp_dir, process.returncode, output, pgf_path,
+                           pdf_path):
+            return
+    await loop.run_in_executor(None, latex.compile_pgf, pgf_path, pdf_path,
+                               texsystem, preamble)
@@ -16,7 +16,12 @@
 #
 # axes.py
 
-from pubplot.helpers import RCParamWrapper
+import numpy as np
+
+from pubplot.decimation import decimate_on_draw
+from pubplot.density import (DEFAULT_CHUNK_SIZE, ArrayChunks, DensityImage,
+                             data_range)
+from pubplot.helpers import RCParamWrapper, rc_context
 
 
 class PubAxes(RCParamWrapper):
@@ -24,10 +29,118 @@ class PubAxes(RCParamWrapper):
 
     This wraps Axes objects which allows us to use local RCparams.
 
+    Dense line plots may be decimated by setting the ``pubplot.decimate``
+    style option (or ``:plot:pubplot.decimate``) to True. Lines are then
+    drawn with at most four points per pixel column of the final layout and
+    view limits, see ``pubplot.decimation``, so the output size no longer
+    depends on the number of points. The line data are kept intact. Calls
+    made to the raw Axes (e.g., from ``session``) are not decimated.
+
     Attributes:
         ax: A matplotlib Axes object or function that returns such object
         rc: Matplotlib RCparams
     """
 
+    __slots__ = ()
+
     def __init__(self, ax, rc):
         super(PubAxes, self).__init__(ax, rc)
+
+    def plot(self, *args, **kwargs):
+        """Matplotlib ``Axes.plot`` with optional decimation.
+
+        Examples:
+            >>> import numpy as np
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom, {'pubplot.decimate': True})
+            >>> fig, ax = doc.subfigures()
+            >>> x = np.linspace(0, 1, 1000000)
+            >>> line, = ax.plot(x, np.sin(100 * x))
+            >>> len(line.get_xdata())
+            1000000
+            >>> len(line.visible_indices()) < 20000
+            True
+            >>> _ = ax.set_xlim(0, 0.001)
+            >>> len(line.visible_indices())
+            1001
+        """
+        lines = self.__getattr__('plot')(*args, **kwargs)
+        if self.rc.get_option('plot', 'pubplot.decimate', False):
+            for line in lines:
+                decimate_on_draw(line)
+        return lines
+
+    def density_scatter(self, x, y=None, range=None, shape=None,
+                        chunksize=DEFAULT_CHUNK_SIZE, **kwargs):
+        """Scatter plot of many points drawn as a density image.
+
+        Points are counted in a grid with one cell per pixel of the Axes,
+        as laid out when the figure is drawn, and the grid is embedded in the
+        figure as a raster image. The output size therefore does not depend
+        on the number of points, while axes, ticks and labels remain vector
+        text typeset by LaTeX. The grid follows the Axes scales (e.g., log)
+        and empty cells are transparent, see ``pubplot.density.DensityImage``.
+
+        Points are accumulated in chunks, ``x`` may also be an iterable of
+        ``(x, y)`` chunks, in which case the points don't need to fit in
+        memory at once.
+
+        Examples:
+            >>> import numpy as np
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> fig, ax = doc.subfigures()
+            >>> x = np.random.normal(size=1000000)
+            >>> y = x + np.random.normal(size=x.size)
+            >>> image = ax.density_scatter(x, y)
+            >>> int(image.get_array().sum())
+            1000000
+
+            Chunks may come from any iterable, but the range must be given.
+            A one-shot iterator (e.g., a generator) is read when the figure
+            is first drawn, later layout changes don't count it again.
+
+            >>> chunks = [np.random.rand(2, 1000) for _ in range(10)]
+            >>> image = ax.density_scatter(chunks, range=((0, 1), (0, 1)))
+            >>> int(image.get_array().sum())
+            10000
+
+        Args:
+            x: x coordinates or iterable of ``(x, y)`` chunks.
+            y: y coordinates, None if ``x`` is an iterable of chunks.
+            range: ``((xmin, xmax), (ymin, ymax))`` covered by the image,
+                   defaults to the range of the points. Required for chunks.
+            shape: ``(rows, columns)`` of the grid, defaults to the pixels
+                   covered by the Axes.
+            chunksize: number of points counted at a time.
+            **kwargs: passed to ``AxesImage``, e.g., ``cmap`` or ``norm``,
+                      ``vmin``, ``vmax`` and ``aspect`` work as in
+                      ``imshow``.
+
+        Returns:
+            A ``pubplot.density.DensityImage``.
+        """
+        if y is None:
+            if range is None:
+                raise ValueError('range is required when x is an iterable '
+                                 'of chunks')
+            chunks = x
+        else:
+            if range is None:
+                range = data_range(x, y)
+            chunks = ArrayChunks(x, y, chunksize)
+
+        vmin = kwargs.pop('vmin', None)
+        vmax = kwargs.pop('vmax', None)
+        aspect = kwargs.pop('aspect', None)
+        kwargs.setdefault('interpolation', 'nearest')
+        self.__getattr__('imshow')  # creates lazy Axes under the imshow rc
+        with rc_context(self.rc.get_validated_rc('imshow')):
+            image = DensityImage(self.obj, chunks, range, shape, **kwargs)
+            if vmin is not None or vmax is not None:
+                image.set_clim(vmin, vmax)
+            if aspect is not None:
+                self.obj.set_aspect(aspect)
+        return image
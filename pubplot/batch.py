@@ -0,0 +1,212 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# batch.py
+
+from collections import namedtuple
+import gc
+import re
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+BatchRecord = namedtuple('BatchRecord', ['name', 'saved', 'rss', 'peak_rss'])
+BatchRecord.__doc__ = """Memory used by a figure of a ``FigureBatch``.
+
+Attributes:
+    name: file name without extension.
+    saved: False if an incremental save skipped the figure.
+    rss: resident set size in bytes once the figure was saved and closed, or
+        None if it is not available (e.g., outside Linux).
+    peak_rss: peak resident set size in bytes while the figure was created and
+        saved, or the peak of the whole process if it cannot be reset.
+"""
+
+
+class MemoryLimitError(MemoryError):
+    """Raised when a ``FigureBatch`` exceeds its memory ceiling.
+
+    Attributes:
+        record: the ``BatchRecord`` of the last figure.
+    """
+
+    def __init__(self, record, max_rss):
+        super(MemoryLimitError, self).__init__(
+            'memory usage {} after saving {!r} exceeds the limit of {}'
+            .format(format_bytes(record.rss), record.name,
+                    format_bytes(max_rss)))
+        self.record = record
+
+
+def format_bytes(size):
+    """Formats a size in bytes.
+
+    Examples:
+        >>> format_bytes(3 * 1024 ** 2)
+        '3.0 MiB'
+    """
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'TiB'
+    return '{:.1f} {}'.format(size, unit)
+
+
+def memory_usage():
+    """Returns the current and peak resident set size of the process.
+
+    Returns:
+        rss, peak_rss: sizes in bytes, or None if not available. Outside
+            Linux, only the peak size is usually available.
+    """
+    try:
+        with open(PROC_STATUS) as f:
+            status = dict(re.findall(r'^Vm(RSS|HWM):\s+(\d+) kB', f.read(),
+                                     re.MULTILINE))
+        return int(status['RSS']) * 1024, int(status['HWM']) * 1024
+    except (IOError, KeyError):
+        pass
+    if resource is None:
+        return None, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024  # kB everywhere else
+    return None, peak
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process, supported on Linux.
+
+    Returns:
+        True if the peak was reset.
+    """
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+class FigureBatch(object):
+    """Creates and saves figures one at a time with bounded memory.
+
+    Every figure saved by the batch is closed (see ``PubFigure.close``) and
+    its memory usage is recorded. If the resident set size exceeds
+    ``max_rss`` after a figure is saved, garbage is collected; if it still
+    exceeds ``max_rss``, MemoryLimitError is raised, rather than letting the
+    process be killed later on. The ceiling is not checked where the current resident set size is not available
+    (see ``memory_usage``). Figures that were created but not saved are
+    closed when the batch exits.
+
+    Use ``Document.batch`` to create a batch.
+
+    Args:
+        document: the ``pubplot.Document`` that creates the figures.
+        max_rss: memory ceiling in bytes, or None.
+
+    Attributes:
+        document: the ``pubplot.Document`` that creates the figures.
+        records: a ``BatchRecord`` per saved figure.
+        max_rss: memory ceiling in bytes, or None.
+    """
+
+    def __init__(self, document, max_rss=None):
+        self.document = document
+        self.max_rss = max_rss
+        self.records = []
+        self._open = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def subfigures(self, *args, **kwargs):
+        """Same as ``Document.subfigures``, the figure is tracked by the
+        batch."""
+        reset_peak_rss()
+        fig, axes = self.document.subfigures(*args, **kwargs)
+        self._open.append(fig)
+        return fig, axes
+
+    def save(self, fig, name, **kwargs):
+        """Saves and closes a figure, see ``PubFigure.save``.
+
+        Returns:
+            The ``BatchRecord`` of the figure.
+        """
+        try:
+            saved = fig.save(name, close=True, **kwargs)
+        finally:
+            self._forget(fig)
+        rss, peak = memory_usage()
+        record = BatchRecord(name, saved, rss, peak)
+        self.records.append(record)
+        if self.max_rss is not None and rss is not None and \
+                rss > self.max_rss:
+            self._free_memory()
+            rss, _ = memory_usage()
+            if rss > self.max_rss:
+                raise MemoryLimitError(record._replace(rss=rss),
+                                       self.max_rss)
+        return record
+
+    def close(self):
+        """Closes all figures created by the batch that were not saved."""
+        while self._open:
+            self._open.pop().close()
+
+    @property
+    def peak_rss(self):
+        """Largest peak resident set size among the saved figures."""
+        peaks = [r.peak_rss for r in self.records if r.peak_rss is not None]
+        return max(peaks) if peaks else None
+
+    def report(self):
+        """Returns a table with the memory used by every saved figure.
+
+        Examples:
+            >>> batch = FigureBatch(None)
+            >>> batch.records.append(BatchRecord('a', True, 2 ** 20, 2 ** 21))
+            >>> print(batch.report())
+            figure              rss         peak rss
+            a                   1.0 MiB     2.0 MiB
+        """
+        lines = ['{:<20}{:<12}{}'.format('figure', 'rss', 'peak rss')]
+        for r in self.records:
+            lines.append('{:<20}{:<12}{}'.format(
+                r.name, _format_optional(r.rss), _format_optional(r.peak_rss)))
+        return '\n'.join(lines)
+
+    def _forget(self, fig):
+        self._open = [f for f in self._open if f is not fig]
+
+    def _free_memory(self):
+        gc.collect()
+
+
+def _format_optional(size):
+    return 'n/a' if size is None else format_bytes(size)
@@ -0,0 +1,112 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# cache.py
+
+import errno
+import json
+import os
+import shutil
+import tempfile
+
+CACHE_DIR_ENV = 'PUBPLOT_CACHE_DIR'
+NO_CACHE_ENV = 'PUBPLOT_NO_CACHE'
+
+
+def get_cache_dir():
+    """Returns the directory used by pubplot to persist cached data.
+
+    It can be overridden with the ``PUBPLOT_CACHE_DIR`` environment variable.
+    Otherwise it follows the XDG convention and defaults to
+    ``~/.cache/pubplot``.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        return cache_dir
+    xdg_cache = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(xdg_cache, 'pubplot')
+
+
+def cache_enabled():
+    """Returns False if the persistent cache was disabled by setting the
+    ``PUBPLOT_NO_CACHE`` environment variable.
+    """
+    return os.environ.get(NO_CACHE_ENV, '') in ('', '0')
+
+
+def load(namespace, key):
+    """Loads a cached value.
+
+    Args:
+        namespace: cache section, e.g., ``sizes``.
+        key: string that uniquely identifies the value within the namespace.
+
+    Returns:
+        The cached value or None if it is not in the cache.
+    """
+    path = os.path.join(get_cache_dir(), namespace, key + '.json')
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def store(namespace, key, value):
+    """Stores a JSON-serializable value in the cache.
+
+    The value is written to a temporary file which is then atomically renamed,
+    concurrent readers therefore either see the old or the new value. Failing
+    to write to the cache is not an error, the value is simply not cached.
+
+    Args:
+        namespace: cache section, e.g., ``sizes``.
+        key: string that uniquely identifies the value within the namespace.
+        value: JSON-serializable value.
+    """
+    directory = os.path.join(get_cache_dir(), namespace)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            return
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f, sort_keys=True)
+        os.replace(temp_path, os.path.join(directory, key + '.json'))
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def clear(namespace=None):
+    """Removes cached data.
+
+    Args:
+        namespace: cache section to remove. If None, the entire pubplot cache
+                   is removed.
+    """
+    path = get_cache_dir()
+    if namespace is not None:
+        path = os.path.join(path, namespace)
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,149 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# decimation.py
+
+import math
+
+import numpy as np
+from matplotlib.lines import Line2D
+
+# markers must be drawn for every point, lines using them are not decimated
+_NO_MARKERS = (None, '', ' ', 'None', 'none')
+
+
+def m4_indices(x, y, columns, x_range=None):
+    """Returns the indices of the points that must be kept so that a line
+    looks the same when drawn with ``columns`` pixel columns.
+
+    This is the M4 aggregation: for every pixel column it keeps the first,
+    last, minimum and maximum points, so a line has at most four points per
+    column, regardless of the number of input points.
+
+    Args:
+        x: sorted x coordinates, in display space (e.g., already transformed
+           by a log scale).
+        y: y coordinates.
+        columns: number of pixel columns spanned by ``x_range``.
+        x_range: (start, end) of the columns, defaults to the span of ``x``.
+            Points outside the range are counted in the first or last column.
+
+    Returns:
+        A sorted array of indices.
+
+    Examples:
+        >>> import numpy as np
+        >>> x = np.arange(1000)
+        >>> y = np.sin(x)
+        >>> indices = m4_indices(x, y, 10)
+        >>> len(indices) <= 40
+        True
+        >>> bool(y[indices].min() == y.min() and y[indices].max() == y.max())
+        True
+    """
+    n = len(x)
+    start, end = (x[0], x[-1]) if x_range is None else x_range
+    span = end - start
+    if n <= 4 * columns or span <= 0:
+        return np.arange(n)
+
+    bins = np.clip((x - start) * (columns / span), 0, columns - 1)
+    bins = bins.astype(np.intp)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    ends = np.concatenate((starts[1:], [n])) - 1
+
+    lengths = ends - starts + 1
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    argmin = _first_match(y == np.minimum.reduceat(y, starts)[segment],
+                          segment)
+    argmax = _first_match(y == np.maximum.reduceat(y, starts)[segment],
+                          segment)
+    return np.unique(np.concatenate((starts, ends, argmin, argmax)))
+
+
+def _first_match(mask, segment):
+    # index of the first True value of mask in every segment
+    matches = np.flatnonzero(mask)
+    _, first = np.unique(segment[matches], return_index=True)
+    return matches[first]
+
+
+class DecimatedLine2D(Line2D):
+    """Line2D that is decimated every time it is drawn, see ``m4_indices``.
+
+    Only the points inside the current x view limits, plus one on each side,
+    are drawn, reduced to four points per pixel column of the Axes as laid
+    out at draw time. The line data are never modified, so changing the
+    limits or the layout after plotting does not lose points.
+
+    Lines with markers, with x values out of order or with missing values
+    (NaN or masked, which break the line) are drawn intact.
+    """
+
+    def visible_indices(self):
+        """Returns the indices of the points drawn with the current view
+        limits and layout, or None if the line is drawn intact.
+        """
+        if self.get_marker() not in _NO_MARKERS:
+            return None
+        xy = self.get_xydata()
+        columns = max(int(math.ceil(self.axes.bbox.width)), 1)
+        if len(xy) <= 4 * columns or not np.isfinite(xy).all():
+            return None
+        transform = self.axes.xaxis.get_transform()
+        x = transform.transform(xy[:, 0])
+        if not np.isfinite(x).all() or (np.diff(x) < 0).any():
+            return None
+
+        xlim = np.array(self.axes.get_xlim())
+        low, high = sorted(transform.transform(xlim))
+        start = max(np.searchsorted(x, low, 'left') - 1, 0)
+        stop = np.searchsorted(x, high, 'right') + 1
+        return start + m4_indices(x[start:stop], xy[start:stop, 1], columns,
+                                  (low, high))
+
+    def drawn_size(self):
+        """Returns the number of points drawn with the current view limits
+        and layout.
+        """
+        indices = self.visible_indices()
+        return len(self.get_xydata()) if indices is None else len(indices)
+
+    def draw(self, renderer):
+        indices = self.visible_indices()
+        if indices is None:
+            return super(DecimatedLine2D, self).draw(renderer)
+        data = self.get_xdata(orig=True), self.get_ydata(orig=True)
+        xy = self.get_xydata()
+        self.set_data(xy[indices, 0], xy[indices, 1])
+        try:
+            return super(DecimatedLine2D, self).draw(renderer)
+        finally:
+            self.set_data(*data)
+
+
+def decimate_on_draw(line):
+    """Makes a Line2D decimated when drawn, see ``DecimatedLine2D``.
+
+    Args:
+        line: a matplotlib Line2D.
+
+    Returns:
+        True if the line will be decimated, i.e., it is a plain Line2D.
+    """
+    if type(line) is Line2D:
+        line.__class__ = DecimatedLine2D
+    return isinstance(line, DecimatedLine2D)
@@ -0,0 +1,191 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# density.py
+
+import math
+
+from matplotlib.image import AxesImage
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+
+def axes_shape(ax, dpi=None):
+    """Returns the number of pixel ``(rows, columns)`` covered by an Axes.
+
+    Args:
+        ax: a matplotlib Axes.
+        dpi: resolution, defaults to the figure dpi.
+    """
+    fig = ax.figure
+    if dpi is None:
+        dpi = fig.dpi
+    position = ax.get_position()
+    width, height = fig.get_size_inches()
+    return (max(1, int(math.ceil(position.height * height * dpi))),
+            max(1, int(math.ceil(position.width * width * dpi))))
+
+
+def array_chunks(x, y, chunksize=DEFAULT_CHUNK_SIZE):
+    """Splits x and y into chunks of at most ``chunksize`` points."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.shape != y.shape:
+        raise ValueError('x and y must have the same shape')
+    x = x.ravel()
+    y = y.ravel()
+    for start in range(0, len(x), chunksize):
+        yield x[start:start + chunksize], y[start:start + chunksize]
+
+
+class ArrayChunks(object):
+    """Iterable of the chunks of x and y, see ``array_chunks``."""
+
+    def __init__(self, x, y, chunksize=DEFAULT_CHUNK_SIZE):
+        self.x = x
+        self.y = y
+        self.chunksize = chunksize
+
+    def __iter__(self):
+        return array_chunks(self.x, self.y, self.chunksize)
+
+
+def data_range(x, y):
+    """Returns ``((xmin, xmax), (ymin, ymax))`` ignoring non-finite values."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        raise ValueError('no finite points')
+    x = x[finite]
+    y = y[finite]
+    return (x.min(), x.max()), (y.min(), y.max())
+
+
+def accumulate_density(chunks, data_range, shape):
+    """Counts points in a regular 2D grid, one chunk at a time.
+
+    Only one chunk has to be in memory at a time, so ``chunks`` may, for
+    instance, read points from disk.
+
+    Args:
+        chunks: iterable of ``(x, y)`` pairs of arrays.
+        data_range: ``((xmin, xmax), (ymin, ymax))`` covered by the grid,
+                    points out of the range are ignored.
+        shape: ``(rows, columns)`` of the grid.
+
+    Returns:
+        An array with ``shape`` where ``counts[i, j]`` is the number of points
+        in row ``i`` (from the bottom) and column ``j``.
+
+    Examples:
+        >>> chunks = [([0.1, 0.9], [0.1, 0.1]), ([0.9], [0.9])]
+        >>> accumulate_density(chunks, ((0, 1), (0, 1)), (2, 2))
+        array([[1, 1],
+               [0, 1]])
+    """
+    rows, columns = shape
+    (xmin, xmax), (ymin, ymax) = data_range
+    xscale = columns / float(xmax - xmin) if xmax > xmin else 0.0
+    yscale = rows / float(ymax - ymin) if ymax > ymin else 0.0
+    counts = np.zeros(rows * columns, dtype=np.int64)
+    for x, y in chunks:
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        # NaN fails both comparisons and is dropped as well
+        inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        column = ((x[inside] - xmin) * xscale).astype(np.intp)
+        row = ((y[inside] - ymin) * yscale).astype(np.intp)
+        # points on the upper edges belong to the last row and column
+        np.minimum(column, columns - 1, out=column)
+        np.minimum(row, rows - 1, out=row)
+        counts += np.bincount(row * columns + column,
+                              minlength=rows * columns)
+    return counts.reshape(shape)
+
+
+class DensityImage(AxesImage):
+    """Image of the number of points in every pixel of an Axes.
+
+    Points are counted when the image is drawn, in a grid with one cell per
+    pixel of the Axes as laid out at that time, e.g., after tight layout.
+    The grid is regular in the space of the Axes scales, so cells on a log
+    axis cover equal ratios. Points are counted again when the layout or
+    the scales change, except when they come from a one-shot iterator (e.g.,
+    a generator), which is only read the first time. Empty cells are masked.
+
+    Args:
+        ax: a matplotlib Axes, the image is added to it.
+        chunks: iterable of ``(x, y)`` pairs of arrays.
+        data_range: ``((xmin, xmax), (ymin, ymax))`` covered by the image, in
+                    data coordinates.
+        shape: ``(rows, columns)`` of the grid, defaults to the pixels
+               covered by the Axes.
+        **kwargs: passed to ``AxesImage``, e.g., ``cmap`` or ``norm``.
+    """
+
+    def __init__(self, ax, chunks, data_range, shape=None, **kwargs):
+        super(DensityImage, self).__init__(ax, origin='lower', **kwargs)
+        self._chunks = chunks
+        self._data_range = data_range
+        self._shape = shape
+        self._density_key = None
+        self._scale_extent = None
+        self.set_transform(ax.transLimits + ax.transAxes)
+        (xmin, xmax), (ymin, ymax) = data_range
+        self.set_extent((xmin, xmax, ymin, ymax))
+        self.set_clip_path(ax.patch)
+        ax.add_image(self)
+        if iter(chunks) is not chunks:
+            self.update_density()
+
+    def update_density(self):
+        """Counts the points if the layout or the scales changed since they
+        were last counted.
+        """
+        ax = self.axes
+        shape = tuple(self._shape or axes_shape(ax))
+        xscale = ax.xaxis.get_transform()
+        yscale = ax.yaxis.get_transform()
+        (xmin, xmax), (ymin, ymax) = self._data_range
+        xmin, xmax = xscale.transform(np.array([xmin, xmax], dtype=float))
+        ymin, ymax = yscale.transform(np.array([ymin, ymax], dtype=float))
+        key = shape, xmin, xmax, ymin, ymax
+        if key == self._density_key or self._chunks is None:
+            return
+
+        chunks = ((xscale.transform(np.asarray(x, dtype=float).ravel()),
+                   yscale.transform(np.asarray(y, dtype=float).ravel()))
+                  for x, y in self._chunks)
+        counts = accumulate_density(chunks, ((xmin, xmax), (ymin, ymax)),
+                                    shape)
+        if iter(self._chunks) is self._chunks:
+            self._chunks = None  # consumed
+        self._density_key = key
+        self._scale_extent = xmin, xmax, ymin, ymax
+        self.set_data(np.ma.masked_equal(counts, 0))
+
+    def get_extent(self):
+        """Returns the extent of the image in the space of the Axes scales,
+        where the grid is regular.
+        """
+        self.update_density()
+        return self._scale_extent
+
+    def draw(self, renderer, *args, **kwargs):
+        self.update_density()
+        return super(DensityImage, self).draw(renderer, *args, **kwargs)
@@ -17,15 +17,13 @@
 # document.py
 
 from math import sqrt
+import warnings
 
-import matplotlib as mpl
-from matplotlib.figure import Figure
-
-from pubplot.axes import PubAxes
-from pubplot.figure import PubFigure
-from pubplot.helpers import RCParams
-from pubplot.latex import get_document_sizes
-from pubplot.styles import dichromatic
+# matplotlib is only imported once a figure is created, see pubplot/__init__
+from pubplot.helpers import RCParams, RCStyle, rc_context
+from pubplot.latex import (DOCUMENT_SIZES, get_document_sizes,
+                           get_document_sizes_many)
+from pubplot.size_tables import get_precomputed_sizes
 
 inches_per_pt = 1.0 / 72.27
 golden_ratio = (1.0 + sqrt(5.0)) / 2.0
@@ -43,6 +41,10 @@ class Document(object):
             may optionally contain a list of LaTeX packages under ``packages``
             as well as any other argument acceptable by ``pylatex.document``.
         style: dict following matplotlib rcParams convention.
+        verify_sizes: document classes from ``pubplot.document_classes`` use
+            precomputed sizes by default. If True, sizes are always measured
+            with LaTeX and a warning is issued if they differ from the
+            precomputed ones.
 
     Attributes:
         style: dict following matplotlib rcParams convention.
@@ -93,6 +95,11 @@ class Document(object):
         prepend ``:<plot_style>:`` to any option in order to apply it only to
         the specific plot type (e.g., bar).
 
+        Options prefixed with ``pubplot.`` are not rcParams, they configure
+        pubplot itself. For instance, ``'pubplot.decimate': True`` reduces
+        dense line plots to the points visible at the figure dpi (see
+        ``pubplot.axes.PubAxes``).
+
         Once you have a document, you can obtain any LaTeX font size related to
         the ``document_class`` you specified, e.g.,
         
@@ -104,12 +111,138 @@ class Document(object):
     FONT_OVERRIDES = ['font.size', 'axes.labelsize', 'legend.fontsize',
             'xtick.labelsize', 'ytick.labelsize']
 
-    def __init__(self, document_class, style=None):
-        sizes = get_document_sizes(document_class)
+    def __init__(self, document_class, style=None, verify_sizes=False):
+        sizes = get_precomputed_sizes(document_class)
+        if sizes is None or verify_sizes:
+            measured = get_document_sizes(document_class,
+                                          use_cache=not verify_sizes)
+            sizes = self._checked_sizes(sizes, measured)
+        self._init(document_class, sizes, style)
+
+    @classmethod
+    def create(cls, document_class, style=None, verify_sizes=False):
+        """Coroutine that creates a Document without blocking the event loop.
+
+        It accepts the same arguments as the constructor, but LaTeX runs as an
+        asyncio subprocess.
+
+        Examples:
+            >>> import asyncio
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = asyncio.run(Document.create(ieee_infocom))
+            >>> doc.columnwidth
+            252.0
+        """
+        from pubplot.aio import create_document
+        return create_document(cls, document_class, style, verify_sizes)
+
+    @classmethod
+    def from_sizes(cls, document_class, sizes, style=None):
+        """Creates a Document from known sizes, without running LaTeX.
+
+        Sizes may come from ``Document.sizes`` or
+        ``pubplot.latex.get_document_sizes``, e.g., measured once in a parent
+        process and shipped to worker processes. Documents are also picklable
+        and may be sent to workers directly.
+
+        Examples:
+            >>> import pickle
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> Document.from_sizes(ieee_infocom, doc.sizes).columnwidth
+            252.0
+            >>> pickle.loads(pickle.dumps(doc)).style == doc.style
+            True
+
+        Args:
+            document_class: same as in the constructor.
+            sizes: dict with all sizes in ``pubplot.latex.DOCUMENT_SIZES``.
+            style: same as in the constructor.
+        """
+        missing = [k for k in DOCUMENT_SIZES if k not in sizes]
+        if missing:
+            raise ValueError('missing document sizes: {}'.format(
+                ', '.join(missing)))
+        doc = cls.__new__(cls)
+        doc._init(document_class, {k: sizes[k] for k in DOCUMENT_SIZES},
+                  style)
+        return doc
+
+    @property
+    def sizes(self):
+        """Dict with the document sizes, as accepted by ``from_sizes``."""
+        return {k: getattr(self, k) for k in DOCUMENT_SIZES}
+
+    def __getstate__(self):
+        # the style already carries everything derived from the document
+        # class (e.g., packages in the preamble), the document class itself
+        # and compiled styles are not pickled
+        state = self.__dict__.copy()
+        state['style'] = dict(self.style)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.style = RCStyle(self.style)
+
+    @staticmethod
+    def _checked_sizes(precomputed, measured):
+        if precomputed is not None and measured != precomputed:
+            warnings.warn('LaTeX sizes {} differ from precomputed sizes {}'
+                          .format(measured, precomputed))
+        return measured
+
+    @classmethod
+    def for_classes(cls, document_classes, style=None, workers=None):
+        """Creates one Document per document class, probing LaTeX for all
+        document classes concurrently.
+
+        Args:
+            document_classes: list of document class dicts or a dict mapping
+                names to document class dicts.
+            style: dict following matplotlib rcParams convention, applied to
+                all documents.
+            workers: maximum number of concurrent LaTeX processes, defaults to
+                the number of CPUs.
+
+        Returns:
+            A list of Documents in the same order as ``document_classes`` or,
+            if ``document_classes`` is a dict, a dict mapping the same names to
+            Documents.
+
+        Examples:
+            >>> from pubplot import document_classes as dc
+            >>> docs = Document.for_classes({'infocom': dc.ieee_infocom,
+            ...                              'journal': dc.ieee_jrnl})
+            >>> docs['journal'].columnwidth
+            252.0
+        """
+        if isinstance(document_classes, dict):
+            names = list(document_classes.keys())
+            docs = cls.for_classes([document_classes[n] for n in names], style,
+                                   workers)
+            return dict(zip(names, docs))
+
+        document_classes = list(document_classes)
+        sizes = [get_precomputed_sizes(dc) for dc in document_classes]
+        missing = [i for i, s in enumerate(sizes) if s is None]
+        measured = get_document_sizes_many(
+            [document_classes[i] for i in missing], workers)
+        for i, s in zip(missing, measured):
+            sizes[i] = s
+
+        docs = []
+        for document_class, s in zip(document_classes, sizes):
+            doc = cls.__new__(cls)
+            doc._init(document_class, s, style)
+            docs.append(doc)
+        return docs
+
+    def _init(self, document_class, sizes, style):
         self.__dict__.update(sizes)
 
         # check https://matplotlib.org/users/customizing.html for some options
-        self.style = {
+        self.style = RCStyle({
             'pgf.texsystem': 'pdflatex',
             'text.usetex': True,
             'figure.dpi': 600,  # recommended DPI for journal prints
@@ -131,7 +264,7 @@ class Document(object):
                 r"\usepackage[utf8x]{inputenc}",
                 r"\usepackage[T1]{fontenc}",
             ]
-        }
+        })
         if style is not None:
             self.update_style(style)
 
@@ -207,6 +340,69 @@ class Document(object):
                 style.setdefault(k, style['font.size'])
         self.style.update(style)
 
+    def prewarm_text_cache(self, texts=(), sizes=None, tick_labels=True):
+        """Measures the texts figures will use ahead of time.
+
+        Laying out a figure requires LaTeX to measure every text, e.g., each
+        tick label. Metrics are kept in the pubplot cache, shared by all
+        processes using the same LaTeX engine and preamble (see
+        ``pubplot.textcache``), so prewarming once spares the first figures,
+        or every worker process, from waiting for hundreds of measurements.
+
+        Examples:
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> _ = doc.prewarm_text_cache(['Time (s)', 'Throughput (Gbps)'])
+
+        Args:
+            texts: strings as they appear in figures, e.g., axis labels.
+            sizes: font sizes in pt, defaults to the sizes of the style.
+            tick_labels: if True also measures tick labels for common tick
+                steps.
+
+        Returns:
+            The ``pubplot.textcache.TextLayoutCache``, or None if the cache
+            is disabled.
+        """
+        from pubplot.textcache import default_texts, prewarm_text_cache
+
+        if sizes is None:
+            sizes = sorted({self.style[k] for k in self.FONT_OVERRIDES
+                            if k in self.style})
+        with rc_context(RCParams(self.style).get_validated_rc('save')):
+            texts = list(texts)
+            if tick_labels:
+                texts.extend(default_texts())
+            return prewarm_text_cache(texts, sizes)
+
+    def batch(self, max_rss=None):
+        """Returns a ``pubplot.batch.FigureBatch`` to create many figures
+        with bounded memory.
+
+        Figures saved by the batch are closed, and the resident set size of
+        the process after each figure and its peak while the figure was
+        created and saved are recorded.
+
+        Examples:
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> with doc.batch(max_rss=4 * 1024 ** 3) as batch:
+            ...     for i in range(3):
+            ...         fig, ax = batch.subfigures()
+            ...         _ = ax.plot([1, 2, 3], [1, 2 * i, 3 * i])
+            ...         _ = batch.save(fig, 'test_batch_{}'.format(i))
+            >>> len(batch.records)
+            3
+
+        Args:
+            max_rss: memory ceiling in bytes, MemoryLimitError is raised if
+                the process uses more once a figure is saved and garbage is
+                collected. Ignored where the current resident set size is not
+                available, see ``pubplot.batch.memory_usage``.
+        """
+        from pubplot.batch import FigureBatch
+        return FigureBatch(self, max_rss)
+
     def figure(self, width=None, height=None, scale=1, xscale=1, yscale=1):
         """Creates a new figure with a single plot.
 
@@ -231,8 +427,12 @@ class Document(object):
         height = height * inches_per_pt * yscale * scale
         figsize = [width, height]
 
-        plain_rc_params = RCParams(self.style).get_rc_to_function('')
-        with mpl.rc_context(rc=plain_rc_params):
+        import matplotlib as mpl
+        from matplotlib.figure import Figure
+        from pubplot.figure import PubFigure
+
+        plain_rc_params = RCParams(self.style).get_validated_rc('')
+        with rc_context(plain_rc_params):
             fig = Figure(figsize=figsize, frameon=False,
                     tight_layout={'pad': 0,
                         'w_pad': mpl.rcParams['figure.subplot.wspace'],
@@ -262,6 +462,8 @@ class Document(object):
             fig, axes: a Figure and a list of axes, or, if squeeze == True,
                     a Figure and an axis object.
         """
+        from pubplot.axes import PubAxes
+
         if height is None:
             # Auto-determine figure height; scale it by the number of subplots
             # by default.
@@ -271,7 +473,9 @@ class Document(object):
         # range is bad in py2.7 however we expect this to be short
         for i in range(1, nrows*ncols+1):
             def lazy_ax(nrows=nrows, ncols=ncols, i=i):
-                return fig.add_subplot(nrows, ncols, i)
+                # PubAxes already applies the rc for the first method called,
+                # use the raw Figure to avoid wrapping the Axes twice
+                return fig._figure().add_subplot(nrows, ncols, i)
             ax = PubAxes(lazy_ax, self.style)
             axes.append(ax)
 
@@ -280,3 +484,61 @@ class Document(object):
             axes = axes[0]
         return fig, axes
 
+    def save_all(self, figures, workers=None, pdf=True, pgf=True,
+                 incremental=False):
+        """Saves many figures in parallel, using a pool of processes.
+
+        Figures are pickled and sent to the workers along with their style, so
+        each figure is saved with its own rcParams. Errors are not raised but
+        returned for every figure, so that one broken figure does not prevent
+        the others from being saved.
+
+        Args:
+            figures: dict mapping file names (without extension) to figures or
+                a list of ``(name, figure)`` pairs.
+            workers: maximum number of worker processes, defaults to the
+                number of CPUs. If 1, figures are saved in this process.
+            pdf: if True saves figures in pdf format
+            pgf: if True saves figures in pgf format
+            incremental: if True skips saving unchanged figures, see
+                ``PubFigure.save``
+
+        Returns:
+            A list of ``pubplot.figure.SaveResult``, one per figure, in the
+            same order as ``figures``.
+
+        Examples:
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> figures = {}
+            >>> for i in range(1, 4):
+            ...     fig, ax = doc.subfigures()
+            ...     _ = ax.plot([1, 2, 3], [1, 2 * i, 3 * i])
+            ...     figures['test_all_{}'.format(i)] = fig
+            >>> results = doc.save_all(figures)
+            >>> [r.error for r in results]
+            [None, None, None]
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from pubplot.figure import SaveResult, save_figure
+
+        if isinstance(figures, dict):
+            figures = figures.items()
+        figures = list(figures)
+
+        if workers == 1 or len(figures) <= 1:
+            return [save_figure(fig, name, pdf, pgf, incremental)
+                    for name, fig in figures]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(save_figure, fig, name, pdf, pgf,
+                                       incremental)
+                       for name, fig in figures]
+            results = []
+            for (name, _), future in zip(figures, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # e.g., the figure could not be pickled
+                    results.append(SaveResult(name, e, False))
+        return results
@@ -16,13 +16,183 @@
 #
 # figure.py
 
+from collections import namedtuple
+import io
+import os
+import pickle
+import shutil
+import traceback
 import warnings
 
 import matplotlib as mpl
-from matplotlib.backends.backend_pgf import FigureCanvasPgf
 
 from pubplot.axes import PubAxes
-from pubplot.helpers import RCParamWrapper
+from pubplot.helpers import RCParamWrapper, rc_context
+from pubplot.incremental import (figure_fingerprint, forget_fingerprint,
+                                 is_up_to_date, store_fingerprint)
+from pubplot.latex import (_engine_signature, get_pgf_compiler,
+                           temporary_directory)
+from pubplot.panels import save_panels
+from pubplot.rasterization import heavy_artists
+from pubplot.textcache import text_cache
+
+
+def _pgf_preamble():
+    # Preamble used by matplotlib to compile pgf figures. It depends on the
+    # current rcParams.
+    from matplotlib.backends import backend_pgf
+
+    if hasattr(backend_pgf, '_get_preamble'):
+        return backend_pgf._get_preamble()
+    preamble = backend_pgf.get_preamble()
+    if not isinstance(preamble, str):
+        preamble = '\n'.join(preamble)
+    return '\n'.join([preamble, backend_pgf.get_fontspec()])
+
+
+def _is_file_like(target):
+    return hasattr(target, 'write')
+
+
+def _file_formats(name, pdf, pgf, incremental):
+    # formats saved to files named after ``name``, the others are written to
+    # file-like objects
+    formats = [ext for ext, target in (('pdf', pdf), ('pgf', pgf))
+               if target and not _is_file_like(target)]
+    if formats and name is None:
+        raise ValueError('a file name is required to save {} files'
+                         .format(' and '.join(formats)))
+    if incremental and (_is_file_like(pdf) or _is_file_like(pgf)):
+        raise ValueError('incremental saves require file names')
+    return formats
+
+
+def _copy_to_file_like(path, target):
+    with open(path, 'rb') as f:
+        shutil.copyfileobj(f, target)
+
+
+class SaveRequest(object):
+    """Where and whether a figure is saved, as requested to
+    ``PubFigure.save``.
+
+    Shared by ``PubFigure.save`` and ``pubplot.aio.save_figure``, which only
+    differ in how they draw and compile the figure: the figure is saved
+    unless ``skip`` returns True, it is drawn to ``pgf_stream`` if there is
+    nothing to compile, otherwise to ``pgf_path``, and the pdf is compiled to
+    ``pdf_path``; ``write_pgf``, ``write_pdf`` and ``finish`` are called once
+    the files are written.
+
+    Args:
+        name: file name without extension, may be None if the figure is
+              only written to file-like objects
+        pdf: True, False or a binary file-like object.
+        pgf: True, False or a binary file-like object.
+        incremental: if True skips saving unchanged figures.
+
+    Raises:
+        ValueError: a file name is required but missing.
+    """
+    def __init__(self, name, pdf, pgf, incremental):
+        self.name = name
+        self.pdf = pdf
+        self.pgf = pgf
+        self.incremental = incremental
+        self.formats = _file_formats(name, pdf, pgf, incremental)
+        self.fingerprint = None
+
+    def skip(self, fingerprint=None):
+        """Returns True if the files are up to date.
+
+        Incremental saves must pass the figure fingerprint, which ``finish``
+        records. Other saves forget the fingerprints of the files they are
+        about to overwrite.
+        """
+        if self.incremental:
+            self.fingerprint = fingerprint
+            return is_up_to_date(self.name, fingerprint, self.formats)
+        if self.formats:
+            forget_fingerprint(self.name)
+        return False
+
+    @property
+    def pgf_stream(self):
+        """The file-like object the pgf is drawn to if there is nothing to
+        compile, None otherwise."""
+        if not self.pdf and _is_file_like(self.pgf):
+            return self.pgf
+        return None
+
+    def pgf_path(self, temp_dir):
+        """Returns the path the pgf is drawn to."""
+        if self.pgf and not _is_file_like(self.pgf):
+            return self.name + '.pgf'
+        return os.path.join(
+            temp_dir, os.path.basename(self.name or 'figure') + '.pgf')
+
+    def pdf_path(self, temp_dir):
+        """Returns the path the pdf is compiled to, or None."""
+        if _is_file_like(self.pdf):
+            return os.path.join(temp_dir, 'figure.pdf')
+        return self.name + '.pdf' if self.pdf else None
+
+    def write_pgf(self, pgf_path):
+        """Copies the pgf drawn to ``pgf_path`` to the file-like object."""
+        if _is_file_like(self.pgf):
+            _copy_to_file_like(pgf_path, self.pgf)
+
+    def write_pdf(self, pdf_path):
+        """Copies the pdf compiled to ``pdf_path`` to the file-like object."""
+        if _is_file_like(self.pdf):
+            _copy_to_file_like(pdf_path, self.pdf)
+
+    def finish(self):
+        """Records the fingerprint of incremental saves."""
+        if self.incremental:
+            store_fingerprint(self.name, self.fingerprint, self.formats)
+
+
+def _remove_artists(ax):
+    # removed one by one, Axes.cla replaces the artist lists but the artists
+    # left in them would still be referenced, in a cycle, by their remove
+    # method until the garbage collector runs
+    for name in ('artists', 'collections', 'images', 'lines', 'patches',
+                 'tables', 'texts'):
+        for artist in list(getattr(ax, name)):
+            artist.remove()
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.remove()
+
+
+SaveResult = namedtuple('SaveResult', ['name', 'error', 'skipped'])
+SaveResult.__doc__ = """Outcome of saving a figure with ``Document.save_all``.
+
+Attributes:
+    name: file name without extension.
+    error: exception raised while saving the figure, or None on success.
+    skipped: True if an incremental save found the figure unchanged.
+"""
+
+
+def save_figure(fig, name, pdf=True, pgf=True, incremental=False):
+    """Saves a figure, returning errors instead of raising them.
+
+    Used by ``Document.save_all`` in worker processes.
+
+    Returns:
+        A SaveResult.
+    """
+    try:
+        saved = fig.save(name, pdf=pdf, pgf=pgf, incremental=incremental)
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+        except Exception:
+            # the error must travel back to the parent process
+            e = RuntimeError(traceback.format_exc())
+        return SaveResult(name, e, False)
+    return SaveResult(name, None, not saved)
 
 
 class PubFigure(RCParamWrapper):
@@ -35,36 +205,336 @@ class PubFigure(RCParamWrapper):
         fig: A matplotlib Figure object or function that returns such object.
         rc: Matplotlib RCparams.
 
+    Artists that draw many vertices or elements are rasterized when saving
+    if the ``pubplot.rasterize_threshold`` style option is set, see
+    ``heavy_artists``.
+
+    Figures may be used as context managers, which ``close`` the figure on
+    exit.
+
+    Text is measured by LaTeX to lay out the figure, the metrics are kept in
+    the pubplot cache and shared by all processes, see
+    ``pubplot.textcache``.
+
     Attributes:
         fig: A matplotlib Figure object.
+        rasterized: ``(artist, size)`` pairs automatically rasterized by the
+            last save.
     """
 
+    __slots__ = ('fig', 'rasterized')
+
     def __init__(self, fig, rc):
         super(PubFigure, self).__init__(fig, rc)
         self.fig = fig
+        self.rasterized = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def _figure(self):
+        # also the lazy constructor of closed figures
+        if self.fig is None:
+            raise ValueError('the figure was closed')
+        return self.fig
 
     def add_subplot(self, *args, **kwargs):
-        with mpl.rc_context(rc=self.rc.get_rc_to_function('')):
+        with rc_context(self.rc.get_validated_rc('')):
             ax = self.fig.add_subplot(*args, **kwargs)
             return PubAxes(ax, self.rc)
 
-    def save(self, name, pdf=True, pgf=True):
+    def save(self, name, pdf=True, pgf=True, incremental=False, close=False):
         """Save figure to pgf and pdf.
 
         By default it saves the figure in both pdf and pgf, but this behavior
         may be adapted using ``pdf`` and ``pgf`` keyword arguments.
 
+        The figure is drawn only once: the pdf is compiled from the same pgf
+        output, against a preamble that is precompiled once per process (see
+        ``pubplot.latex.PgfCompiler``).
+
+        In incremental mode, the figure ``fingerprint`` is recorded in a
+        manifest (``.pubplot-manifest.json``) next to the saved files. If the
+        figure was already saved with the same fingerprint, it is neither
+        drawn nor written again, which also keeps file modification times, and
+        therefore LaTeX builds of the paper, untouched.
+
+        Instead of files, the figure may be written to binary file-like
+        objects, e.g., ``io.BytesIO``, passed as ``pdf`` and ``pgf``. See also
+        ``render``. A pgf written to a file-like object cannot reference raster
+        images.
+
+        Args:
+            name: file name without extension, may be None if the figure is
+                  only written to file-like objects
+            pdf: if True saves figure in pdf format, if a file-like object
+                 writes the pdf to it
+            pgf: if True saves figure in pgf format, if a file-like object
+                 writes the pgf to it
+            incremental: if True skips saving unchanged figures, requires
+                         saving to files
+            close: if True closes the figure once saved, see ``close``
+
+        Returns:
+            False if the figure was skipped, True otherwise.
+        """
+        self._figure()
+        saved = self._save(name, pdf, pgf, incremental)
+        if close:
+            self.close()
+        return saved
+
+    def _save(self, name, pdf, pgf, incremental):
+        if not pdf and not pgf:
+            return False
+        request = SaveRequest(name, pdf, pgf, incremental)
+        if request.skip(self.fingerprint() if incremental else None):
+            return False
+
+        if request.pgf_stream is not None:
+            # nothing to compile, the pgf never touches the disk
+            self._print_pgf(request.pgf_stream)
+        else:
+            with temporary_directory() as temp_dir:
+                pgf_path = request.pgf_path(temp_dir)
+                texsystem, preamble = self._print_pgf(pgf_path)
+                request.write_pgf(pgf_path)
+                pdf_path = request.pdf_path(temp_dir)
+                if pdf_path is not None:
+                    get_pgf_compiler(texsystem, preamble).compile(pgf_path,
+                                                                  pdf_path)
+                    request.write_pdf(pdf_path)
+        request.finish()
+        return True
+
+    def save_panels(self, name, pdf=True, pgf=True, incremental=False,
+                    workers=None, close=False):
+        """Save every Axes of the figure as a panel of its own.
+
+        The layout of the whole figure is computed once, then each panel is
+        drawn to ``<name>-panel<i>.pgf`` and ``.pdf`` (numbered from 1, in the
+        order the Axes were created), cropped to the Axes and its labels. The
+        panels are compiled by concurrent LaTeX processes. Figure-level
+        artists (e.g., a suptitle) are not part of any panel.
+
+        ``<name>.pgf`` lays out the panels, at their original positions and
+        sizes, and may be included in LaTeX documents in place of the whole
+        figure. Likewise, ``<name>.pdf`` is assembled from the panel pdfs.
+        When ``<name>.pgf`` is not in the directory of the main document,
+        either load the currfile package (``\\usepackage{currfile}``) or
+        include it with the import package (``\\import{figures/}{fig.pgf}``),
+        so that LaTeX finds the panels next to it, see
+        ``pubplot.panels.pgf_layout_source``.
+
+        With ``incremental``, every panel is fingerprinted separately and only
+        the panels that changed are drawn and compiled again (see ``save``).
+
+        Examples:
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> fig, axes = doc.subfigures(2, 2)
+            >>> for i, ax in enumerate(axes):
+            ...     _ = ax.plot([1, 2, 3], [i, 2 * i, 3 * i])
+            >>> fig.save_panels('test_panels')
+            [True, True, True, True]
+
         Args:
             name: file name without extension
-            pdf: if True saves figure in pdf format
-            pgf: if True saves figure in pgf format
+            pdf: if True saves panels and layout in pdf format
+            pgf: if True saves panels and layout in pgf format
+            incremental: if True skips saving unchanged panels
+            workers: maximum number of concurrent LaTeX processes, defaults
+                     to the number of CPUs.
+            close: if True closes the figure once saved, see ``close``
+
+        Returns:
+            A list with one item per panel, False if the panel was skipped.
+        """
+        self._figure()
+        saved = save_panels(self, name, pdf, pgf, incremental, workers)
+        if close:
+            self.close()
+        return saved
+
+    def close(self):
+        """Frees the figure contents.
+
+        Artists, and the data they hold, are removed from the figure and
+        cached renderers are dropped, so memory is released even if Axes are
+        still referenced. The figure and its Axes must not be used afterwards.
+
+        Examples:
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> fig, ax = doc.subfigures()
+            >>> with fig:
+            ...     _ = ax.plot(range(1000))
+            >>> len(ax.lines)
+            0
+            >>> fig.savefig('closed.pdf')
+            Traceback (most recent call last):
+                ...
+            ValueError: the figure was closed
+        """
+        if self.fig is None:
+            return
+        from matplotlib.backend_bases import FigureCanvasBase
+
+        fig = self.fig
+        for ax in fig.axes:
+            _remove_artists(ax)
+        fig.clf()
+        FigureCanvasBase(fig)  # drops the renderer of the last canvas
+        self.fig = None
+        self.obj = None
+        self.lazy_obj = self._figure
+        self._methods.clear()
+        self._methods_obj = None
+        self.rasterized = []
+
+    def render(self, format='pdf'):
+        """Returns the figure as bytes, without writing it to a file.
+
+        Examples:
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> fig, ax = doc.subfigures()
+            >>> _ = ax.plot([1, 2, 3], [1, 2, 3])
+            >>> fig.render('pdf')[:4]
+            b'%PDF'
+
+        Args:
+            format: either ``pdf`` or ``pgf``.
+
+        Returns:
+            The contents of the pdf or pgf file.
         """
-        with mpl.rc_context(rc=self.rc.get_rc_to_function('save')):
-            canvas = FigureCanvasPgf(self.fig)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                kw = {'bbox_inches': 'tight', 'pad_inches': 0}
-                if pgf:
-                    canvas.print_figure(name + '.pgf', **kw)
-                if pdf:
-                    canvas.print_figure(name + '.pdf', **kw)
+        if format not in ('pdf', 'pgf'):
+            raise ValueError('unsupported format {!r}, use pdf or pgf'
+                             .format(format))
+        output = io.BytesIO()
+        targets = {'pdf': False, 'pgf': False}
+        targets[format] = output
+        self.save(None, **targets)
+        return output.getvalue()
+
+    def fingerprint(self, ax=None, extra=()):
+        """Returns a hash of the figure contents and style.
+
+        It is used by incremental saves and must be computed before the figure
+        is drawn, see ``pubplot.incremental.figure_fingerprint``.
+
+        Args:
+            ax: if given, only the contents of this Axes are hashed.
+            extra: other values that affect the output.
+        """
+        texsystem = self.rc.rc_dict.get('pgf.texsystem',
+                                        mpl.rcParams['pgf.texsystem'])
+        return figure_fingerprint(self.fig if ax is None else ax,
+                                  self.rc.rc_dict,
+                                  extra=(texsystem,
+                                         _engine_signature(texsystem)) +
+                                  tuple(extra))
+
+    def save_async(self, name, pdf=True, pgf=True, incremental=False,
+                   close=False):
+        """Coroutine version of ``save``.
+
+        Drawing happens in a background thread and the pdf is compiled by a
+        LaTeX subprocess, so the event loop is never blocked. Drawing is
+        serialized across figures (matplotlib is not thread-safe), while LaTeX
+        runs concurrently. Calls to figures and Axes made from the event loop
+        while a figure is drawn do not wait for the drawing, their rcParams
+        apply on top of the figure's (see ``pubplot.helpers.rc_context``).
+
+        Examples:
+            >>> import asyncio
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> async def plot():
+            ...     doc = await Document.create(ieee_infocom)
+            ...     fig, ax = doc.subfigures()
+            ...     ax.plot([1, 2, 3], [1, 2, 3])
+            ...     await fig.save_async('test_async')
+            >>> asyncio.run(plot())
+
+        Args:
+            name: file name without extension, may be None if the figure is
+                  only written to file-like objects
+            pdf: if True saves figure in pdf format, if a file-like object
+                 writes the pdf to it
+            pgf: if True saves figure in pgf format, if a file-like object
+                 writes the pgf to it
+            incremental: if True skips saving unchanged figures
+            close: if True closes the figure once saved, see ``close``
+        """
+        from pubplot.aio import save_figure
+        self._figure()
+        return save_figure(self, name, pdf, pgf, incremental, close)
+
+    def heavy_artists(self, threshold=None):
+        """Returns the artists that are rasterized when saving the figure.
+
+        Lines, collections (e.g., scatter plots) and patches that draw more
+        than ``threshold`` vertices or elements are rasterized at the figure
+        dpi, text and axes remain vector.
+
+        Examples:
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom,
+            ...                {'pubplot.rasterize_threshold': 10000})
+            >>> fig, ax = doc.subfigures()
+            >>> _ = ax.plot(range(100))
+            >>> _ = ax.scatter(range(100000), range(100000))
+            >>> [size for artist, size in fig.heavy_artists()]
+            [100000]
+
+        Args:
+            threshold: maximum number of vertices or elements, defaults to the
+                ``pubplot.rasterize_threshold`` style option.
+
+        Returns:
+            A list of ``(artist, size)`` pairs, empty if there is no
+            threshold.
+        """
+        if threshold is None:
+            threshold = self.rc.get_option('save',
+                                           'pubplot.rasterize_threshold')
+            if threshold is None:
+                return []
+        return heavy_artists(self.fig, threshold)
+
+    def _print_pgf(self, path, bbox_inches='tight'):
+        """Draws the figure to a pgf file or a binary file-like object.
+
+        Returns:
+            texsystem, preamble: LaTeX engine and preamble needed to compile
+                the pgf file.
+        """
+        # the pgf backend is only loaded when figures are saved
+        from matplotlib.backends.backend_pgf import FigureCanvasPgf
+
+        self.rasterized = self.heavy_artists()
+        previous = [artist.get_rasterized() for artist, _ in self.rasterized]
+        for artist, _ in self.rasterized:
+            artist.set_rasterized(True)
+        try:
+            with rc_context(self.rc.get_validated_rc('save')), \
+                    text_cache():
+                canvas = FigureCanvasPgf(self.fig)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    canvas.print_figure(path, format='pgf',
+                                        bbox_inches=bbox_inches,
+                                        pad_inches=0)
+                return mpl.rcParams['pgf.texsystem'], _pgf_preamble()
+        finally:
+            for (artist, _), rasterized in zip(self.rasterized, previous):
+                artist.set_rasterized(rasterized)
@@ -16,7 +16,12 @@
 #
 # helpers.py
 
-import matplotlib as mpl
+from contextlib import contextmanager
+import contextvars
+import threading
+
+# matplotlib is imported where it is used, Documents can then be created
+# without loading it (see pubplot/__init__.py)
 
 
 class RCParamWrapper(object):
@@ -26,10 +31,15 @@ class RCParamWrapper(object):
     Optionally can use a function that returns an object so that the object is
     lazy initialized
 
+    Method wrappers are created once per method name and reused until the
+    wrapped object changes.
+
     Attributes:
         obj: A matplotlib object or a function that returns such object
         rc: Matplotlib RCparams
     """
+    __slots__ = ('obj', 'lazy_obj', 'rc', '_methods', '_methods_obj')
+
     def __init__(self, obj, rc):
         if callable(obj):  # lazy initialization
             self.lazy_obj = obj
@@ -38,36 +48,340 @@ class RCParamWrapper(object):
             self.obj = obj
             self.lazy_obj = None
         self.rc = RCParams(rc)
+        self._methods = {}
+        self._methods_obj = None
 
     def __getattr__(self, item):
+        if item.startswith('__'):
+            # special methods are looked up on the class (and slots may not
+            # be set yet, e.g., while unpickling)
+            raise AttributeError(item)
+
         if self.obj is None:
-            with mpl.rc_context(rc=self.rc.get_rc_to_function(item)):
+            with rc_context(self.rc.get_validated_rc(item)):
                 self.obj = self.lazy_obj()
 
-        attr = getattr(self.obj, item)
+        if self._methods_obj is not self.obj:
+            self._methods.clear()
+            self._methods_obj = self.obj
 
-        if not callable(attr):
-            return attr
+        cached = self._methods.get(item)
+        if cached is None:
+            attr = getattr(self.obj, item)
 
-        # the following function wraps whatever method is being called in an
-        # rc_context, this enforces the rcparams while being transparent to the
-        # user
+            if not callable(attr):
+                return attr
 
-        def method(*args, **kwargs):
-            with mpl.rc_context(rc=self.rc.get_rc_to_function(item)):
-                return attr(*args, **kwargs)
+            # the following function wraps whatever method is being called in
+            # an rc_context, this enforces the rcparams while being
+            # transparent to the user
+
+            def method(*args, **kwargs):
+                with rc_context(self.rc.get_validated_rc(item)):
+                    return attr(*args, **kwargs)
+
+            self._methods[item] = (method, attr)
+        else:
+            method, attr = cached
+
+        # inside a session the plain rc is already active, methods without
+        # plot-specific options need no wrapping
+        if (_applied_rc() is self.rc.get_validated_rc('')
+                and not self.rc.has_function_rc(item)):
+            return attr
 
         return method
 
+    def __getstate__(self):
+        # method wrappers and lazy constructors are closures, which cannot be
+        # pickled; lazy objects are created before pickling
+        if self.obj is None:
+            with rc_context(self.rc.get_validated_rc('')):
+                self.obj = self.lazy_obj()
+        return self.obj, self.rc.rc_dict
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @contextmanager
+    def session(self):
+        """Returns a context manager that applies the object's rcParams once
+        for a batch of calls.
+
+        Inside the session, methods called on the wrapper are no longer
+        wrapped in an rc context each, except for methods with plot-specific
+        options (e.g., ``:bar:``), which still get their own options applied
+        on every call. The context manager also returns the raw matplotlib
+        object, which may be used directly in tight loops; plot-specific
+        options are not applied to calls made through it.
+
+        Examples:
+            >>> from pubplot import Document
+            >>> from pubplot.document_classes import ieee_infocom
+            >>> doc = Document(ieee_infocom)
+            >>> fig, ax = doc.subfigures()
+            >>> with ax.session() as raw_ax:
+            ...     for i in range(100):
+            ...         _ = raw_ax.plot([0, 1], [i, i])
+            >>> len(ax.lines)
+            100
+        """
+        plain_rc = self.rc.get_validated_rc('')
+        with rc_context(plain_rc):
+            if self.obj is None:
+                self.obj = self.lazy_obj()
+            yield self.obj
+
+
+def _update_raw(rc, params):
+    # updates matplotlib rcParams without validating them again
+    if hasattr(rc, '_update_raw'):
+        rc._update_raw(params)
+    else:
+        dict.update(rc, params)
+
+
+def validate_rc(rc_dict):
+    """Validates rcParams once so that they can be applied with
+    ``rc_context``.
+
+    Args:
+        rc_dict: dict following matplotlib rcParams convention.
+
+    Returns:
+        A dict with the values converted by matplotlib's validators.
+
+    Examples:
+        >>> validate_rc({'lines.linewidth': '2'})
+        {'lines.linewidth': 2.0}
+    """
+    import matplotlib as mpl
+
+    return dict(dict.items(mpl.RcParams(rc_dict)))
+
+
+# style options with this prefix configure pubplot instead of matplotlib
+PUBPLOT_OPTION_PREFIX = 'pubplot.'
+
+# rcParams are global, the options set by the rc contexts active in every
+# thread and task are tracked so that contexts may exit in any order; the
+# lock only guards this bookkeeping and is not held while a context is active
+_rc_lock = threading.Lock()
+_rc_layers = []  # active contexts, in the order they were entered
+_rc_base = {}  # option -> value before the active contexts changed it
+_rc_stack = contextvars.ContextVar('pubplot_rc_stack', default=())
+
+
+class _RCLayer(object):
+    __slots__ = ('rc',)
+
+    def __init__(self, validated_rc):
+        self.rc = validated_rc
+
+
+def _applied_rc():
+    # validated rcParams of the innermost rc_context of this thread or task,
+    # None if there is none or if a context entered elsewhere has since
+    # applied its own
+    stack = _rc_stack.get()
+    if stack and _rc_layers[-1] is stack[-1]:
+        return stack[-1].rc
+    return None
+
+
+def _same_value(a, b):
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+@contextmanager
+def rc_context(validated_rc):
+    """Context manager equivalent to ``matplotlib.rc_context`` for rcParams
+    validated by ``validate_rc``.
 
-def dict_select(my_dict, term, expect=True):
-    return {k: v for k, v in my_dict.items() if expect == k.startswith(term)}
+    Unlike ``matplotlib.rc_context`` it does not run matplotlib's validators
+    and does not copy all of matplotlib's rcParams every time the context is
+    entered. Only the options that differ from the current rcParams are
+    applied, and on exit the options in ``validated_rc`` are reverted to their
+    previous values. Entering the context while the same rcParams are already
+    active (e.g., nested calls) does nothing.
+
+    rcParams are shared by all threads and asyncio tasks. Contexts may be
+    active in several of them at once and exit in any order: on exit, an
+    option keeps the value of the most recently entered context still
+    setting it, or gets back the value it had before any of them. While
+    contexts with different values for the same option are active at once,
+    the most recently entered one applies to all of them.
+
+    Args:
+        validated_rc: dict returned by ``validate_rc``.
+
+    Examples:
+        >>> import matplotlib as mpl
+        >>> rc = validate_rc({'lines.linewidth': 3})
+        >>> linewidth = mpl.rcParams['lines.linewidth']
+        >>> with rc_context(rc):
+        ...     mpl.rcParams['lines.linewidth']
+        3.0
+        >>> mpl.rcParams['lines.linewidth'] == linewidth
+        True
+    """
+    import matplotlib as mpl
+
+    rc_params = mpl.rcParams
+    applied = _applied_rc()
+    with _rc_lock:
+        changed = {}
+        for k, v in validated_rc.items():
+            current = dict.get(rc_params, k)
+            if not _same_value(current, v):
+                changed[k] = v
+            if k not in _rc_base:
+                _rc_base[k] = current
+
+        if not changed and applied is validated_rc:
+            layer = None
+        else:
+            _update_raw(rc_params, changed)
+            layer = _RCLayer(validated_rc)
+            _rc_layers.append(layer)
+
+    if layer is None:
+        yield
+        return
+
+    _rc_stack.set(_rc_stack.get() + (layer,))
+    try:
+        yield
+    finally:
+        _rc_stack.set(tuple(l for l in _rc_stack.get() if l is not layer))
+        with _rc_lock:
+            _rc_layers.remove(layer)
+            if not _rc_layers:
+                restore = dict(_rc_base)
+                _rc_base.clear()
+            else:
+                # options still set by other contexts keep the value of the
+                # most recently entered one
+                restore = {}
+                for k in validated_rc:
+                    for other in reversed(_rc_layers):
+                        if k in other.rc:
+                            restore[k] = other.rc[k]
+                            break
+                    else:
+                        restore[k] = _rc_base.pop(k)
+            _update_raw(rc_params, restore)
+
+class RCStyle(dict):
+    """Style dict that keeps track of its modifications.
+
+    It behaves like a regular dict but increments ``version`` whenever it is
+    modified through dict methods or operators (including ``|=``), which
+    allows compiled versions of the style to be cached. Changes made to the
+    values themselves are not tracked: a value modified in place (e.g., a
+    list that is appended to) must be assigned again for the change to be
+    seen.
+
+    Examples:
+        >>> style = RCStyle({'font.size': 8})
+        >>> version = style.version
+        >>> style['font.size'] = 10
+        >>> style.version > version
+        True
+        >>> version = style.version
+        >>> style |= {'font.size': 9}
+        >>> style.version > version
+        True
+    """
+    __slots__ = ('version', '_compiled')
+
+    def __init__(self, *args, **kwargs):
+        super(RCStyle, self).__init__(*args, **kwargs)
+        self.version = 0
+        self._compiled = None
+
+    def _modified(self):
+        self.version += 1
+        self._compiled = None
+
+    def __setitem__(self, key, value):
+        super(RCStyle, self).__setitem__(key, value)
+        self._modified()
+
+    def __delitem__(self, key):
+        super(RCStyle, self).__delitem__(key)
+        self._modified()
+
+    def update(self, *args, **kwargs):
+        super(RCStyle, self).update(*args, **kwargs)
+        self._modified()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._modified()
+        return super(RCStyle, self).setdefault(key, default)
+
+    def pop(self, *args):
+        self._modified()
+        return super(RCStyle, self).pop(*args)
+
+    def popitem(self):
+        self._modified()
+        return super(RCStyle, self).popitem()
+
+    def clear(self):
+        super(RCStyle, self).clear()
+        self._modified()
+
+    def copy(self):
+        return RCStyle(self)
+
+    def __reduce__(self):
+        return (RCStyle, (dict(self),))
+
+
+class _CompiledStyle(object):
+    """Per-function rcParams resolved from an RCStyle."""
+    __slots__ = ('plain_rc', 'func_index', 'func_rc', 'validated_rc',
+                 'options', 'func_options')
+
+    def __init__(self, rc_dict):
+        self.plain_rc = {}
+        self.func_index = {}  # func -> rcParams prefixed with :func:
+        # pubplot options are not rcParams and are kept apart
+        self.options = {}
+        self.func_options = {}
+        for k, v in rc_dict.items():
+            if not k.startswith(':'):
+                if k.startswith(PUBPLOT_OPTION_PREFIX):
+                    self.options[k] = v
+                else:
+                    self.plain_rc[k] = v
+                continue
+            func, _, option = k[1:].partition(':')
+            if option.startswith(PUBPLOT_OPTION_PREFIX):
+                self.func_options.setdefault(func, {})[option] = v
+            elif option:
+                self.func_index.setdefault(func, {})[option] = v
+        self.func_rc = {}
+        self.validated_rc = {}
 
 
 class RCParams(object):
     """Handle plot-specific rcParams
 
-    Stores rcParams, optionally filtering plot-specific options.
+    Stores rcParams, optionally filtering plot-specific options. The rcParams
+    resolved for every function are computed once and cached until the
+    underlying style is modified.
 
     Args:
         rc_dict: rcParams style dict. With plot-specific options prepended with
@@ -77,18 +391,88 @@ class RCParams(object):
         rc_dict: rcParams style dict. With plot-specific options prepended with
                  the plot type.
 
+    Examples:
+        >>> rc = RCParams({'axes.grid': True, ':bar:axes.grid.axis': 'y'})
+        >>> rc.get_rc_to_function('bar')
+        {'axes.grid': True, 'axes.grid.axis': 'y'}
+        >>> rc.get_rc_to_function('plot')
+        {'axes.grid': True}
+        >>> rc.rc_dict[':bar:axes.grid.axis'] = 'x'
+        >>> rc.get_rc_to_function('bar')
+        {'axes.grid': True, 'axes.grid.axis': 'x'}
+
     """
 
     def __init__(self, rc_dict):
         if isinstance(rc_dict, RCParams):
-            self.rc_dict = rc_dict.rc_dict
-        else:
-            self.rc_dict = rc_dict
+            rc_dict = rc_dict.rc_dict
+        if not isinstance(rc_dict, RCStyle):
+            rc_dict = RCStyle(rc_dict)
+        self.rc_dict = rc_dict
+
+    def _compiled(self):
+        compiled = self.rc_dict._compiled
+        if compiled is None:
+            compiled = _CompiledStyle(self.rc_dict)
+            self.rc_dict._compiled = compiled
+        return compiled
 
     def get_rc_to_function(self, func):
-        plain_rc = dict_select(self.rc_dict, ':', expect=False)
-        func_rc = dict_select(self.rc_dict, ':{}:'.format(func))
-        func_opt_len = len(func)+2
-        func_rc = {k[func_opt_len:]: v for k, v in func_rc.items()}
-        plain_rc.update(func_rc)
-        return plain_rc
+        """Returns the rcParams that apply to ``func``.
+
+        The returned dict is shared between calls and must not be modified.
+        """
+        compiled = self._compiled()
+        rc = compiled.func_rc.get(func)
+        if rc is None:
+            func_rc = compiled.func_index.get(func)
+            if func_rc:
+                rc = compiled.plain_rc.copy()
+                rc.update(func_rc)
+            else:
+                rc = compiled.plain_rc
+            compiled.func_rc[func] = rc
+        return rc
+
+    def has_function_rc(self, func):
+        """Returns True if the style has options specific to ``func``."""
+        return func in self._compiled().func_index
+
+    def get_option(self, func, option, default=None):
+        """Returns a pubplot option (prefixed with ``pubplot.``) that applies
+        to ``func``.
+
+        Examples:
+            >>> rc = RCParams({'pubplot.decimate': False,
+            ...                ':plot:pubplot.decimate': True})
+            >>> rc.get_option('plot', 'pubplot.decimate')
+            True
+            >>> rc.get_option('scatter', 'pubplot.decimate')
+            False
+            >>> rc.get_validated_rc('plot')
+            {}
+        """
+        compiled = self._compiled()
+        func_options = compiled.func_options.get(func)
+        if func_options is not None and option in func_options:
+            return func_options[option]
+        return compiled.options.get(option, default)
+
+    def get_validated_rc(self, func):
+        """Returns the rcParams that apply to ``func`` already validated by
+        matplotlib, ready to be used with ``rc_context``.
+
+        Validation happens once per function until the style is modified. The
+        returned dict is shared between calls and must not be modified.
+        """
+        compiled = self._compiled()
+        rc = compiled.validated_rc.get(func)
+        if rc is None:
+            func_rc = self.get_rc_to_function(func)
+            # functions without specific options share the same validated dict
+            if func_rc is compiled.plain_rc and func != '':
+                rc = self.get_validated_rc('')
+            else:
+                rc = validate_rc(func_rc)
+            compiled.validated_rc[func] = rc
+        return rc
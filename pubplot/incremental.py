@@ -0,0 +1,241 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# incremental.py
+
+import hashlib
+import json
+import os
+import tempfile
+import types
+import weakref
+
+import matplotlib as mpl
+from matplotlib.artist import Artist
+from matplotlib.cbook import CallbackRegistry
+from matplotlib.path import Path
+from matplotlib.transforms import BboxBase, TransformNode
+import numpy as np
+
+MANIFEST_NAME = '.pubplot-manifest.json'
+# bump whenever the fingerprint changes in a way that affects old manifests
+FINGERPRINT_VERSION = 1
+
+_SKIPPED_TYPES = (types.FunctionType, types.MethodType, types.ModuleType,
+                  types.BuiltinFunctionType, weakref.ref, weakref.ProxyType,
+                  CallbackRegistry)
+# attributes that differ between processes without affecting the output
+_SKIPPED_ATTRIBUTES = frozenset(['_parents'])  # transforms, keyed by id()
+
+
+def figure_fingerprint(fig, style, extra=()):
+    """Returns a hash of everything that determines how a figure is drawn.
+
+    The hash covers the state of every artist in the figure (data, colors,
+    text, limits, etc.), the style and the pubplot and matplotlib versions.
+    The document class only affects figures through the style (sizes and
+    preamble), which is why it is not hashed separately. The hash is stable
+    across processes, but it changes once the figure is drawn, so it must be
+    computed before saving.
+
+    Args:
+        fig: a matplotlib Figure, or an Axes to hash a single panel.
+        style: dict following matplotlib rcParams convention.
+        extra: other values that affect the output, e.g., the LaTeX engine.
+
+    Returns:
+        A hex digest.
+
+    Examples:
+        >>> from pubplot import Document
+        >>> from pubplot.document_classes import ieee_infocom
+        >>> doc = Document(ieee_infocom)
+        >>> def plot(y):
+        ...     fig, ax = doc.subfigures()
+        ...     _ = ax.plot([1, 2, 3], y)
+        ...     return figure_fingerprint(fig.fig, doc.style)
+        >>> plot([1, 2, 3]) == plot([1, 2, 3])
+        True
+        >>> plot([1, 2, 3]) == plot([1, 2, 4])
+        False
+    """
+    from pubplot import __version__
+
+    h = hashlib.sha256()
+    _update(h, (FINGERPRINT_VERSION, __version__, mpl.__version__,
+                dict(style), tuple(extra)), set())
+    seen = set()
+    for artist in fig.findobj(include_self=True):
+        _update(h, artist, seen)
+        _update_object(h, artist, seen)
+    return h.hexdigest()
+
+
+def _update(h, value, seen):
+    # Feeds a value to the hash. Artists are hashed by type only since they are
+    # visited separately, other objects by their attributes.
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        h.update(repr(value).encode('utf-8'))
+    elif isinstance(value, bytes):
+        h.update(value)
+    elif isinstance(value, np.ndarray):
+        h.update('{}{}{}'.format(type(value).__name__, value.dtype,
+                                 value.shape).encode('utf-8'))
+        if value.dtype.hasobject:
+            _update(h, value.tolist(), seen)
+        else:
+            h.update(np.ascontiguousarray(value).tobytes())
+        if isinstance(value, np.ma.MaskedArray):
+            _update(h, np.ma.getmaskarray(value), seen)
+    elif isinstance(value, np.generic):
+        _update(h, value.item(), seen)
+    elif isinstance(value, (list, tuple)):
+        h.update('{}{}['.format(type(value).__name__,
+                                len(value)).encode('utf-8'))
+        for v in value:
+            _update(h, v, seen)
+        h.update(b']')
+    elif isinstance(value, dict):
+        # keys are hashed in a canonical order, independent of insertion order
+        h.update('{{{}'.format(len(value)).encode('utf-8'))
+        keys = sorted(((_digest(k), k) for k in value), key=lambda t: t[0])
+        for _, k in keys:
+            _update(h, k, seen)
+            _update(h, value[k], seen)
+        h.update(b'}')
+    elif isinstance(value, (set, frozenset)):
+        h.update('set{}'.format(sorted(_digest(v) for v in value))
+                 .encode('utf-8'))
+    elif isinstance(value, (Artist, _SKIPPED_TYPES)):
+        h.update(type(value).__name__.encode('utf-8'))
+    elif isinstance(value, Path):
+        _update(h, (value.vertices, value.codes), seen)
+    elif isinstance(value, BboxBase):
+        _update(h, value.get_points(), seen)
+    elif isinstance(value, TransformNode) and value.is_affine:
+        _update(h, value.get_matrix(), seen)
+    else:
+        h.update(type(value).__name__.encode('utf-8'))
+        _update_object(h, value, seen)
+
+
+def _update_object(h, obj, seen):
+    # objects referenced more than once are hashed only the first time
+    if id(obj) in seen:
+        h.update(b'@')
+        return
+    seen.add(id(obj))
+    try:
+        attributes = vars(obj)
+    except TypeError:
+        # e.g., datetime, which is represented by its value
+        text = repr(obj)
+        if ' at 0x' not in text:
+            h.update(text.encode('utf-8'))
+        return
+    for k in sorted(attributes):
+        if k in _SKIPPED_ATTRIBUTES:
+            continue
+        h.update(k.encode('utf-8'))
+        _update(h, attributes[k], seen)
+
+
+def _digest(value):
+    h = hashlib.sha256()
+    _update(h, value, set())
+    return h.hexdigest()
+
+
+def manifest_path(name):
+    """Returns the path of the manifest that records the fingerprint of the
+    figure saved as ``name``.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(name)), MANIFEST_NAME)
+
+
+def load_fingerprint(name):
+    """Returns the fingerprint recorded for the figure saved as ``name`` and
+    the formats it was saved in, or (None, []) if there is no record.
+    """
+    entry = _load_manifest(manifest_path(name)).get(os.path.basename(name))
+    if not isinstance(entry, dict):
+        return None, []
+    return entry.get('fingerprint'), entry.get('formats', [])
+
+
+def store_fingerprint(name, fingerprint, formats):
+    """Records the fingerprint of the figure saved as ``name``.
+
+    The manifest is written atomically. If several processes update the same
+    manifest at once, some records may be lost, which only causes the
+    affected figures to be saved again next time.
+
+    Args:
+        name: file name without extension.
+        fingerprint: value returned by ``figure_fingerprint``.
+        formats: extensions of the files that were written, e.g., ``['pdf']``.
+    """
+    path = manifest_path(name)
+    manifest = _load_manifest(path)
+    manifest[os.path.basename(name)] = {'fingerprint': fingerprint,
+                                        'formats': sorted(formats)}
+    _write_manifest(path, manifest)
+
+
+def forget_fingerprint(name):
+    """Removes the record of the figure saved as ``name``, if any.
+
+    Used when a figure is saved without fingerprint, so that a later
+    incremental save does not trust the overwritten files.
+    """
+    path = manifest_path(name)
+    manifest = _load_manifest(path)
+    if manifest.pop(os.path.basename(name), None) is not None:
+        _write_manifest(path, manifest)
+
+
+def is_up_to_date(name, fingerprint, formats):
+    """Returns True if the figure saved as ``name`` has the same fingerprint
+    and all the files in ``formats`` exist.
+    """
+    recorded, recorded_formats = load_fingerprint(name)
+    return (recorded == fingerprint and
+            all(ext in recorded_formats and os.path.exists(name + '.' + ext)
+                for ext in formats))
+
+
+def _load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _write_manifest(path, manifest):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
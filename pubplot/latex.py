@@ -16,23 +16,140 @@
 #
 # latex.py
 
+import atexit
+import hashlib
+import json
 import os
-from pylatex import Document, NoEscape, Command, Package
+import re
+import shutil
 import tempfile
 import subprocess
-import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pubplot import cache
 
 LATEX_BUILT_IN_SIZES = ['tiny', 'scriptsize', 'footnotesize', 'small',
                         'normalsize', 'large', 'Large', 'LARGE', 'huge', 'Huge']
+DOCUMENT_SIZES = ['columnwidth', 'textwidth', 'caption'] + LATEX_BUILT_IN_SIZES
 LOG_PATTERN = '<<<>>>'
+LATEX_ENGINE = 'pdflatex'
+# document_class keys understood by the fast probe
+PROBE_DOCUMENT_KEYS = ('documentclass', 'document_options', 'packages', 'data')
+
+# bump whenever the probe changes in a way that affects the measured sizes
+SIZES_CACHE_VERSION = 2
+SIZES_CACHE_NAMESPACE = 'sizes'
+
+TEMP_DIR_ENV = 'PUBPLOT_TMPDIR'
+
+_sizes_memo = {}
+_sizes_locks = {}
+_sizes_locks_lock = threading.Lock()
+_engine_signature_memo = {}
+_pgf_compilers = {}
+_pgf_compilers_lock = threading.Lock()
+
+
+def document_class_key(document_class):
+    """Returns a stable hash that identifies a document class dict.
+
+    Packages and other pylatex objects are represented by their LaTeX code, so
+    equivalent document classes have the same key across processes.
+
+    Args:
+        document_class: dict with ``documentclass`` and ``document_options``.
+
+    Examples:
+        >>> key = document_class_key({'documentclass': 'article'})
+        >>> key == document_class_key({'documentclass': 'article'})
+        True
+        >>> key == document_class_key({'documentclass': 'IEEEtran'})
+        False
+    """
+    def dump(value):
+        if hasattr(value, 'dumps'):
+            return value.dumps()
+        if isinstance(value, (list, tuple)):
+            return [dump(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): dump(v) for k, v in value.items()}
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return repr(value)
+
+    normalized = dict(document_class)
+    normalized['packages'] = [
+        r'\usepackage{{{}}}'.format(p) if isinstance(p, str) else p
+        for p in document_class.get('packages', [])
+    ]
+    blob = json.dumps(dump(normalized), sort_keys=True)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def temporary_directory():
+    """Returns a private temporary directory for running LaTeX.
+
+    The directory is created under ``PUBPLOT_TMPDIR`` if this environment
+    variable is set (e.g., ``/dev/shm`` to keep LaTeX files in memory) or in
+    the default temporary directory otherwise. It is removed when the
+    returned context manager exits.
+
+    Examples:
+        >>> with temporary_directory() as temp_dir:
+        ...     os.path.isdir(temp_dir)
+        True
+        >>> os.path.exists(temp_dir)
+        False
+    """
+    return tempfile.TemporaryDirectory(prefix='pubplot-',
+                                       dir=os.environ.get(TEMP_DIR_ENV) or None)
+
 
-def get_document_sizes(document_class):
+def _engine_signature(engine=LATEX_ENGINE):
+    # Identifies the installed TeX engine without running it. Changing the TeX
+    # installation changes the binary, which invalidates the cache.
+    signature = _engine_signature_memo.get(engine)
+    if signature is None:
+        path = shutil.which(engine)
+        if path is None:
+            signature = 'missing'
+        else:
+            stat = os.stat(os.path.realpath(path))
+            signature = '{}:{}:{}'.format(os.path.realpath(path),
+                                          stat.st_size, int(stat.st_mtime))
+        _engine_signature_memo[engine] = signature
+    return signature
+
+
+def _sizes_cache_key(document_class):
+    key = '{}|{}|{}'.format(SIZES_CACHE_VERSION,
+                            document_class_key(document_class),
+                            _engine_signature())
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def clear_sizes_cache():
+    """Removes all document sizes cached in memory and on disk."""
+    _sizes_memo.clear()
+    _engine_signature_memo.clear()
+    cache.clear(SIZES_CACHE_NAMESPACE)
+
+
+def get_document_sizes(document_class, use_cache=True):
     """Get useful document sizes given a LaTeX document class.
 
+    Results are cached in memory and in pubplot's cache directory (see
+    ``pubplot.cache``), so LaTeX only runs the first time a document class is
+    used with a given TeX installation. Set ``use_cache=False`` or the
+    ``PUBPLOT_NO_CACHE`` environment variable to always run LaTeX, and call
+    ``clear_sizes_cache`` to invalidate cached results.
+
     Args:
         document_class: dict with ``documentclass`` and ``document_options``. It
             may optionally contain a list of LaTeX packages under ``packages``
             as well as any other argument acceptable by ``pylatex.document``.
+        use_cache: if False, always run LaTeX and bypass the cache.
 
     Examples:
         You may use one of the available document_classes.
@@ -61,7 +178,7 @@ def get_document_sizes(document_class):
          ...    'documentclass': 'IEEEtran',
          ...    'document_options': ['10pt', 'conference', 'letterpaper']
          ... }
-         >>> sizes_dict = get_document_sizes(document_class)
+         >>> sizes_dict = get_document_sizes(document_class, use_cache=False)
          >>> pprint(sizes_dict)
          {'Huge': 24.0,
           'LARGE': 17.0,
@@ -94,9 +211,114 @@ def get_document_sizes(document_class):
         - Huge
         - caption
     """
+    if not use_cache or not cache.cache_enabled():
+        return probe_document_sizes(document_class)
+
+    key = _sizes_cache_key(document_class)
+    sizes_dict = _sizes_memo.get(key)
+    if sizes_dict is not None:
+        return dict(sizes_dict)
+
+    # threads asking for the same document class wait for a single probe
+    with _sizes_locks_lock:
+        key_lock = _sizes_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        sizes_dict = _load_sizes(key)
+        if sizes_dict is None:
+            sizes_dict = probe_document_sizes(document_class)
+            _store_sizes(key, sizes_dict)
+    return dict(sizes_dict)
+
+
+def _load_sizes(key):
+    sizes_dict = _sizes_memo.get(key)
+    if sizes_dict is None:
+        sizes_dict = cache.load(SIZES_CACHE_NAMESPACE, key)
+        if sizes_dict is not None:
+            _sizes_memo[key] = sizes_dict
+    return sizes_dict
+
+
+def _store_sizes(key, sizes_dict):
+    if all(k in sizes_dict for k in DOCUMENT_SIZES):
+        cache.store(SIZES_CACHE_NAMESPACE, key, sizes_dict)
+        _sizes_memo[key] = sizes_dict
+    # incomplete results usually mean LaTeX failed, they are not cached
+
+
+def load_cached_sizes(document_class):
+    """Returns the sizes of ``document_class`` cached by
+    ``get_document_sizes`` or ``store_cached_sizes``.
+
+    Args:
+        document_class: dict as accepted by ``get_document_sizes``.
+
+    Returns:
+        A sizes dict, or None if the sizes were not cached or the cache is
+        disabled.
+    """
+    if not cache.cache_enabled():
+        return None
+    sizes_dict = _load_sizes(_sizes_cache_key(document_class))
+    return None if sizes_dict is None else dict(sizes_dict)
+
+
+def store_cached_sizes(document_class, sizes_dict):
+    """Caches sizes measured by ``probe_document_sizes`` or a ``SizeProbe``.
+
+    Incomplete sizes, usually the result of a LaTeX error, are not cached.
+
+    Args:
+        document_class: dict as accepted by ``get_document_sizes``.
+        sizes_dict: the sizes measured for ``document_class``.
+    """
+    if cache.cache_enabled():
+        _store_sizes(_sizes_cache_key(document_class), sizes_dict)
+
+
+def get_document_sizes_many(document_classes, workers=None, use_cache=True):
+    """Get document sizes for several document classes concurrently.
+
+    Each document class is measured by its own LaTeX process, in its own
+    temporary directory. Cached sizes are returned without running LaTeX.
+
+    Args:
+        document_classes: list of document class dicts or a dict mapping names
+            to document class dicts.
+        workers: maximum number of concurrent LaTeX processes, defaults to the
+            number of CPUs.
+        use_cache: if False, always run LaTeX and bypass the cache.
+
+    Returns:
+        A list of sizes dicts in the same order as ``document_classes`` or, if
+        ``document_classes`` is a dict, a dict mapping the same names to sizes
+        dicts.
+    """
+    if isinstance(document_classes, dict):
+        names = list(document_classes.keys())
+        sizes = get_document_sizes_many(
+            [document_classes[n] for n in names], workers, use_cache)
+        return dict(zip(names, sizes))
+
+    document_classes = list(document_classes)
+    if not document_classes:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(document_classes)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda dc: get_document_sizes(dc, use_cache=use_cache),
+            document_classes))
+
 
+def _get_sizes_command():
+    # Defines \getsizes, which prints every size to the terminal (and log) as
+    # a line starting with LOG_PATTERN. Unlike \typeout, a plain \write is
+    # safe inside the moving caption argument.
     def log_with_name(name, value):
-        return '\\wlog{{{}{}={}}}'.format(LOG_PATTERN, name, value)
+        return r'\immediate\write\@unused{{{}{}={}}}'.format(
+            LOG_PATTERN, name, value)
 
     def log_text_size(text_size_name):
         return '\\{} a {} \n\n'.format(text_size_name,
@@ -123,42 +345,486 @@ def get_document_sizes(document_class):
         get_sizes_command += log_text_size(size)
 
     get_sizes_command += '}'
+    return get_sizes_command
 
-    temp_doc_name = next(tempfile._get_candidate_names())
 
-    document_kwargs = document_class.copy()
-    packages = document_kwargs.pop('packages', [])
-
-    doc = Document(temp_doc_name, **document_kwargs)
-    doc.packages = packages
-    doc.preamble.append(NoEscape(get_sizes_command))
-    doc.append(Command('title', 'Title'))
-    doc.append(Command('maketitle'))
-    doc.append('Lorem ipsum dolor sit amet, consectetur adipiscing elit. Nam c'
-               'onsectetur volutpat tellus vel ultricies. Donec ullamcorper or'
-               'ci quis ante volutpat efficitur. Aenean at rhoncus nibh. Morbi'
-               ' vitae justo velit. Curabitur eget condimentum quam, nec accum'
-               'san nulla. Nam tempor sem id tellus consectetur condimentum. N'
-               'ullam id lacus purus. Nam nisi nisi, tempus ac ligula luctus, '
-               'mollis volutpat odio. Mauris euismod mi nec rutrum tempor.\n'
-               * 20)
-    doc.append(NoEscape(r'\getsizes'))
-    
+def _dumps(item):
+    from pylatex import NoEscape
+    from pylatex.utils import escape_latex
+
+    if hasattr(item, 'dumps'):
+        return item.dumps()
+    if isinstance(item, NoEscape):
+        return item
+    return escape_latex(item)
+
+
+def _probe_source(document_class):
+    """Returns a minimal LaTeX document that prints the document sizes."""
+    options = document_class.get('document_options') or []
+    if not isinstance(options, str):
+        options = ','.join(options)
+    lines = [r'\documentclass[{}]{{{}}}'.format(
+        options, document_class.get('documentclass', 'article'))]
+    for p in document_class.get('packages', []):
+        if isinstance(p, str):
+            lines.append(r'\usepackage{{{}}}'.format(p))
+        else:
+            lines.append(p.dumps())
+    lines.append(_get_sizes_command())
+    lines.append(r'\begin{document}')
+    lines.extend(_dumps(d) for d in document_class.get('data') or [])
+    lines.extend([r'\normalsize', r'\title{Title}', r'\maketitle',
+                  r'\getsizes', r'\end{document}', ''])
+    return '\n'.join(lines)
+
+
+class SizeProbe(object):
+    """A LaTeX run that measures the sizes of a document class.
+
+    Entering the probe writes a minimal document to a temporary directory,
+    which is removed on exit. LaTeX must run ``command`` in ``directory`` in
+    draft mode, and every line it prints is passed to ``feed``; LaTeX may be
+    stopped as soon as ``feed`` returns True. Document classes using
+    ``pylatex.Document`` arguments other than ``documentclass``,
+    ``document_options``, ``packages`` and ``data`` are not supported (see
+    ``supports``) and must be measured with the slower
+    ``probe_document_sizes_pylatex``.
+
+    Args:
+        document_class: dict as accepted by ``get_document_sizes``.
+
+    Attributes:
+        command: LaTeX command line.
+        directory: directory LaTeX must run in, None outside the context.
+        sizes: sizes parsed so far.
+    """
+    # -draftmode skips writing the PDF, we only need the sizes printed to the
+    # terminal
+    command = [LATEX_ENGINE, '-draftmode', '-interaction=nonstopmode',
+               '-file-line-error', 'probe.tex']
+
+    def __init__(self, document_class):
+        self.document_class = document_class
+        self.directory = None
+        self.sizes = {}
+        self._temp_dir = None
+
+    @staticmethod
+    def supports(document_class):
+        """Returns True if ``document_class`` may be measured by a probe."""
+        return all(k in PROBE_DOCUMENT_KEYS for k in document_class)
+
+    def __enter__(self):
+        # each probe runs in its own directory so that concurrent probes do
+        # not interfere with each other
+        self._temp_dir = temporary_directory()
+        self.directory = self._temp_dir.name
+        with open(os.path.join(self.directory, 'probe.tex'), 'w') as f:
+            f.write(_probe_source(self.document_class))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self._temp_dir.cleanup()
+        self._temp_dir = None
+        self.directory = None
+
+    def feed(self, line):
+        """Parses a line printed by LaTeX, either str or bytes.
+
+        Returns:
+            True once all sizes were printed.
+        """
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        _parse_size_line(line, self.sizes)
+        return all(k in self.sizes for k in DOCUMENT_SIZES)
+
+
+def _parse_size_line(line, sizes_dict):
+    # Parses a line printed by \getsizes, e.g., ``<<<>>>textwidth=516.0pt``
+    start = line.find(LOG_PATTERN)
+    if start < 0:
+        return
+    variable, _, value = line[start + len(LOG_PATTERN):].strip().partition('=')
     try:
-        doc.generate_pdf(temp_doc_name, clean=False)
-    except subprocess.CalledProcessError:
+        sizes_dict[variable] = float(value[0:-2])
+    except ValueError:
         pass
 
-    with open(temp_doc_name + '.log', 'r') as f:
-        lines = f.read().splitlines()
+
+def probe_document_sizes(document_class):
+    """Runs LaTeX to measure sizes for ``document_class``, bypassing the
+    cache.
+
+    A minimal document is compiled in draft mode and LaTeX is stopped as soon
+    as all sizes were printed (see ``SizeProbe``), unsupported document
+    classes are measured with ``probe_document_sizes_pylatex``.
+    """
+    if not SizeProbe.supports(document_class):
+        return probe_document_sizes_pylatex(document_class)
+
+    with SizeProbe(document_class) as probe:
+        process = subprocess.Popen(probe.command, cwd=probe.directory,
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        try:
+            for line in process.stdout:
+                if probe.feed(line):
+                    break
+        finally:
+            process.kill()
+            process.stdout.close()
+            process.wait()
+
+    return probe.sizes
+
+
+def probe_document_sizes_pylatex(document_class):
+    """Runs LaTeX through pylatex to measure sizes for ``document_class``.
+
+    This compiles a complete document and is considerably slower than
+    ``probe_document_sizes``, but it accepts any argument supported by
+    ``pylatex.Document``.
+    """
+    from pylatex import Command, Document, NoEscape, Package
+
+    document_kwargs = document_class.copy()
+    packages = [Package(NoEscape(p)) if isinstance(p, str) else p
+                for p in document_kwargs.pop('packages', [])]
+
+    with temporary_directory() as temp_dir:
+        temp_doc_name = os.path.join(temp_dir, 'probe')
+
+        doc = Document(temp_doc_name, **document_kwargs)
+        doc.packages = packages
+        doc.preamble.append(NoEscape(_get_sizes_command()))
+        doc.append(Command('title', 'Title'))
+        doc.append(Command('maketitle'))
+        doc.append('Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+                   'Nam consectetur volutpat tellus vel ultricies. Donec ullam'
+                   'corper orci quis ante volutpat efficitur. Aenean at rhonc'
+                   'us nibh. Morbi vitae justo velit. Curabitur eget condimen'
+                   'tum quam, nec accumsan nulla. Nam tempor sem id tellus co'
+                   'nsectetur condimentum. Nullam id lacus purus. Nam nisi ni'
+                   'si, tempus ac ligula luctus, mollis volutpat odio. Mauris'
+                   ' euismod mi nec rutrum tempor.\n' * 20)
+        doc.append(NoEscape(r'\getsizes'))
+
+        try:
+            doc.generate_pdf(temp_doc_name, clean=False)
+        except subprocess.CalledProcessError:
+            pass
+
+        with open(temp_doc_name + '.log', 'r') as f:
+            lines = f.read().splitlines()
 
     sizes_dict = {}
     for l in lines:
-        if l.startswith(LOG_PATTERN):
-            variable, value = l.split('=')
-            variable = variable[len(LOG_PATTERN):]
-            sizes_dict[variable] = float(value[0:-2])
-
-    list(map(os.remove, glob.glob(temp_doc_name + '.*')))
+        _parse_size_line(l, sizes_dict)
 
     return sizes_dict
+
+
+PGF_JOB_NAME = 'pubplot-figure'
+PGF_FORMAT_NAME = 'pubplot-preamble'
+# bump whenever the precompiled preamble changes
+PGF_FORMAT_VERSION = 1
+PGF_FORMAT_NAMESPACE = 'formats'
+_PGF_SIZE_RE = re.compile(r'\\pgfpathrectangle\{\\pgfpointorigin\}'
+                          r'\{\\pgfqpoint\{([0-9.]+)in\}\{([0-9.]+)in\}\}')
+
+
+def pgf_picture_size(pgf_path):
+    """Returns the size (in inches) of a picture generated by matplotlib's pgf
+    backend.
+
+    Args:
+        pgf_path: path to the pgf file.
+
+    Returns:
+        width, height: picture size in inches.
+    """
+    with open(pgf_path, 'r') as f:
+        for line in f:
+            match = _PGF_SIZE_RE.search(line)
+            if match is not None:
+                return float(match.group(1)), float(match.group(2))
+    raise ValueError('{} is not a matplotlib pgf picture'.format(pgf_path))
+
+
+def _pgf_preamble_lines(preamble):
+    return [
+        r'\documentclass[12pt]{minimal}',
+        r'\usepackage{geometry}',
+        r'\usepackage{pgf}',
+        preamble,
+    ]
+
+
+def pgf_compile_command(texsystem, precompiled=False):
+    """Returns the command that compiles a pgf picture prepared by
+    ``prepare_pgf_compile``.
+    """
+    command = [texsystem, '-interaction=nonstopmode', '-halt-on-error']
+    if precompiled:
+        command.append('-fmt=' + PGF_FORMAT_NAME)
+    return command + [PGF_JOB_NAME + '.tex']
+
+
+def prepare_pgf_compile(temp_dir, pgf_path, preamble, format_dir=None):
+    """Prepares ``temp_dir`` to compile a pgf picture to pdf.
+
+    The picture is compiled on a page of its own size, as matplotlib does when
+    saving pdf files with the pgf backend. Raster images referenced by the
+    picture are looked up in the directory of ``pgf_path``.
+
+    Args:
+        temp_dir: empty directory where LaTeX will run.
+        pgf_path: path to the pgf file.
+        preamble: LaTeX preamble required by the picture.
+        format_dir: directory with the preamble precompiled by a
+                    ``PgfCompiler``. If given, the preamble is not typeset
+                    again and LaTeX must run with
+                    ``pgf_compile_command(texsystem, precompiled=True)``.
+
+    Returns:
+        The environment LaTeX should run with. The pdf is written to
+        ``PGF_JOB_NAME + '.pdf'`` inside ``temp_dir``.
+    """
+    pgf_path = os.path.abspath(pgf_path)
+    width, height = pgf_picture_size(pgf_path)
+    linked_pgf = os.path.join(temp_dir, PGF_JOB_NAME + '.pgf')
+    try:
+        os.symlink(pgf_path, linked_pgf)
+    except (AttributeError, NotImplementedError, OSError):
+        shutil.copyfile(pgf_path, linked_pgf)
+
+    lines = [] if format_dir is not None else _pgf_preamble_lines(preamble)
+    with open(os.path.join(temp_dir, PGF_JOB_NAME + '.tex'), 'w') as f:
+        f.write('\n'.join(lines + [
+            r'\geometry{{papersize={{{:f}in,{:f}in}}, margin=0in}}'
+            .format(width, height),
+            r'\begin{document}',
+            r'\centering',
+            r'\input{' + PGF_JOB_NAME + '.pgf}',
+            r'\end{document}',
+            '',
+        ]))
+
+    env = os.environ.copy()
+    env['TEXINPUTS'] = (os.path.dirname(pgf_path) + os.pathsep +
+                        env.get('TEXINPUTS', ''))
+    if format_dir is not None:
+        env['TEXFORMATS'] = (format_dir + os.pathsep +
+                             env.get('TEXFORMATS', ''))
+    return env
+
+
+def _run_latex(temp_dir, env, command):
+    process = subprocess.Popen(command, cwd=temp_dir, env=env,
+                               stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+    output, _ = process.communicate()
+    return process.returncode, output
+
+
+def _run_pgf_compile(temp_dir, env, command, pgf_path, pdf_path):
+    returncode, output = _run_latex(temp_dir, env, command)
+    check_pgf_compile(returncode, output, pgf_path)
+    shutil.copyfile(os.path.join(temp_dir, PGF_JOB_NAME + '.pdf'), pdf_path)
+
+
+def compile_pgf(pgf_path, pdf_path, texsystem, preamble):
+    """Compiles a pgf picture generated by matplotlib to pdf.
+
+    The preamble is typeset from scratch, ``get_pgf_compiler`` returns a
+    compiler that avoids this when compiling several pictures.
+
+    Args:
+        pgf_path: path to the pgf file.
+        pdf_path: path to the pdf file that will be written.
+        texsystem: LaTeX engine, e.g., ``pdflatex``.
+        preamble: LaTeX preamble required by the picture.
+    """
+    with temporary_directory() as temp_dir:
+        env = prepare_pgf_compile(temp_dir, pgf_path, preamble)
+        _run_pgf_compile(temp_dir, env, pgf_compile_command(texsystem),
+                         pgf_path, pdf_path)
+
+
+def compile_tex(source, pdf_path, texsystem, input_dir, source_name):
+    """Compiles a LaTeX document that includes files from ``input_dir``.
+
+    Args:
+        source: LaTeX source of the document.
+        pdf_path: path to the pdf file that will be written.
+        texsystem: LaTeX engine, e.g., ``pdflatex``.
+        input_dir: directory searched for files included by the document.
+        source_name: what the source was generated from, shown if LaTeX
+                     fails, e.g., ``'panel layout of fig'``.
+    """
+    with temporary_directory() as temp_dir:
+        with open(os.path.join(temp_dir, PGF_JOB_NAME + '.tex'), 'w') as f:
+            f.write(source)
+        env = os.environ.copy()
+        env['TEXINPUTS'] = (os.path.abspath(input_dir) + os.pathsep +
+                            env.get('TEXINPUTS', ''))
+        _run_pgf_compile(temp_dir, env, pgf_compile_command(texsystem),
+                         source_name, pdf_path)
+
+
+def check_pgf_compile(returncode, output, pgf_path):
+    """Raises RuntimeError if LaTeX failed to compile ``pgf_path``."""
+    if returncode != 0:
+        raise RuntimeError('LaTeX was not able to process {}:\n{}'.format(
+            pgf_path, output.decode('utf-8', 'replace')))
+
+
+def get_pgf_compiler(texsystem, preamble):
+    """Returns the ``PgfCompiler`` for a LaTeX engine and preamble.
+
+    Compilers are shared by the whole process, so figures from documents that
+    use the same preamble reuse the same precompiled format.
+    """
+    key = (texsystem, preamble)
+    with _pgf_compilers_lock:
+        compiler = _pgf_compilers.get(key)
+        if compiler is None:
+            compiler = PgfCompiler(texsystem, preamble)
+            _pgf_compilers[key] = compiler
+    return compiler
+
+
+class PgfCompiler(object):
+    """Compiles pgf pictures against a precompiled preamble.
+
+    Loading LaTeX packages (in particular pgf and fonts) dominates the time
+    it takes to compile a figure. The compiler dumps the preamble to a LaTeX
+    format once and every following compilation starts from it. Formats are
+    kept in pubplot's cache directory (see ``pubplot.cache``), so they are
+    also reused by later processes. If the format cannot be created, pictures
+    are compiled from scratch as in ``compile_pgf``.
+
+    Args:
+        texsystem: LaTeX engine, e.g., ``pdflatex``.
+        preamble: LaTeX preamble required by the pictures.
+    """
+    def __init__(self, texsystem, preamble):
+        self.texsystem = texsystem
+        self.preamble = preamble
+        self._format_dir = None
+        self._format_failed = False
+        self._lock = threading.Lock()
+
+    def format_dir(self):
+        """Returns the directory with the precompiled format, creating the
+        format if needed, or None if it could not be created.
+        """
+        with self._lock:
+            if self._format_dir is None and not self._format_failed:
+                self._format_dir = self._load_or_dump_format()
+                self._format_failed = self._format_dir is None
+            return self._format_dir
+
+    def prepare(self, temp_dir, pgf_path):
+        """Prepares ``temp_dir`` to compile ``pgf_path``, once LaTeX ran the
+        compilation must be completed by ``finish``.
+
+        Returns:
+            command, env: the LaTeX command and the environment it should run
+                with in ``temp_dir``.
+        """
+        format_dir = self.format_dir()
+        env = prepare_pgf_compile(temp_dir, pgf_path, self.preamble,
+                                  format_dir)
+        command = pgf_compile_command(self.texsystem,
+                                      precompiled=format_dir is not None)
+        return command, env
+
+    def finish(self, temp_dir, returncode, output, pgf_path, pdf_path):
+        """Completes a compilation prepared by ``prepare``.
+
+        Args:
+            temp_dir: directory LaTeX ran in.
+            returncode: LaTeX exit status.
+            output: LaTeX output, as bytes.
+            pgf_path: path to the pgf file.
+            pdf_path: path to the pdf file that will be written.
+
+        Returns:
+            False if LaTeX failed with the precompiled format, which may be
+            stale or incompatible; the picture must then be compiled with
+            ``compile_pgf``, which reports the error if the picture itself is
+            broken. True once the pdf is written.
+
+        Raises:
+            RuntimeError: LaTeX failed without a precompiled format.
+        """
+        if returncode != 0 and self.format_dir() is not None:
+            return False
+        check_pgf_compile(returncode, output, pgf_path)
+        shutil.copyfile(os.path.join(temp_dir, PGF_JOB_NAME + '.pdf'),
+                        pdf_path)
+        return True
+
+    def compile(self, pgf_path, pdf_path):
+        """Compiles a pgf picture generated by matplotlib to pdf.
+
+        Args:
+            pgf_path: path to the pgf file.
+            pdf_path: path to the pdf file that will be written.
+        """
+        with temporary_directory() as temp_dir:
+            command, env = self.prepare(temp_dir, pgf_path)
+            returncode, output = _run_latex(temp_dir, env, command)
+            if self.finish(temp_dir, returncode, output, pgf_path, pdf_path):
+                return
+        compile_pgf(pgf_path, pdf_path, self.texsystem, self.preamble)
+
+    def _format_key(self):
+        key = '{}|{}|{}|{}'.format(PGF_FORMAT_VERSION, self.texsystem,
+                                   _engine_signature(self.texsystem),
+                                   self.preamble)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _load_or_dump_format(self):
+        if cache.cache_enabled():
+            format_dir = os.path.join(cache.get_cache_dir(),
+                                      PGF_FORMAT_NAMESPACE, self._format_key())
+        else:
+            format_dir = tempfile.mkdtemp(prefix='pubplot-format-',
+                                          dir=os.environ.get(TEMP_DIR_ENV))
+            atexit.register(shutil.rmtree, format_dir, True)
+
+        format_path = os.path.join(format_dir, PGF_FORMAT_NAME + '.fmt')
+        if os.path.exists(format_path):
+            return format_dir
+        try:
+            os.makedirs(format_dir, exist_ok=True)
+            with temporary_directory() as temp_dir:
+                with open(os.path.join(temp_dir, PGF_FORMAT_NAME + '.tex'),
+                          'w') as f:
+                    f.write('\n'.join(_pgf_preamble_lines(self.preamble) +
+                                      [r'\dump', '']))
+                subprocess.run(
+                    [self.texsystem, '-ini', '-interaction=nonstopmode',
+                     '-halt-on-error', '-jobname=' + PGF_FORMAT_NAME,
+                     '&' + self.texsystem, PGF_FORMAT_NAME + '.tex'],
+                    cwd=temp_dir, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    check=True)
+                # concurrent processes may dump the same format, the rename
+                # makes sure LaTeX never loads a partially written one
+                fd, temp_path = tempfile.mkstemp(dir=format_dir,
+                                                 suffix='.tmp')
+                os.close(fd)
+                shutil.copyfile(
+                    os.path.join(temp_dir, PGF_FORMAT_NAME + '.fmt'),
+                    temp_path)
+                os.replace(temp_path, format_path)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return format_dir
@@ -0,0 +1,253 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# panels.py
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import os
+
+import matplotlib as mpl
+from matplotlib.transforms import Bbox
+
+from pubplot.helpers import rc_context
+from pubplot.incremental import (forget_fingerprint, is_up_to_date,
+                                 store_fingerprint)
+from pubplot.latex import compile_tex, get_pgf_compiler, temporary_directory
+from pubplot.textcache import text_cache
+
+
+def panel_name(name, index):
+    """Returns the file name (without extension) of the panel ``index`` of
+    the figure saved as ``name``.
+
+    Examples:
+        >>> panel_name('results/latency', 0)
+        'results/latency-panel1'
+    """
+    return '{}-panel{}'.format(name, index + 1)
+
+
+@contextmanager
+def frozen_layout(fig):
+    """Context manager that runs the figure layout (e.g., tight layout) once
+    and keeps it while some artists are hidden.
+    """
+    if hasattr(fig, 'get_layout_engine'):
+        engine = fig.get_layout_engine()
+        if engine is not None:
+            engine.execute(fig)
+        fig.set_layout_engine('none')
+        try:
+            yield
+        finally:
+            fig.set_layout_engine(engine)
+    else:
+        params = fig._tight_parameters if fig.get_tight_layout() else None
+        if params is not None:
+            fig.tight_layout(**params)
+        fig.set_tight_layout(False)
+        try:
+            yield
+        finally:
+            fig.set_tight_layout(params if params is not None else False)
+
+
+def panel_bboxes(fig, renderer):
+    """Returns ``(ax, bbox)`` pairs with the bounding box, in inches, of every
+    visible Axes of the figure, including its labels.
+    """
+    to_inches = fig.dpi_scale_trans.inverted()
+    return [(ax, ax.get_tightbbox(renderer).transformed(to_inches))
+            for ax in fig.axes if ax.get_visible()]
+
+
+def layout_source(panels, include):
+    r"""Returns LaTeX code that places panels as in the original figure.
+
+    Args:
+        panels: list of ``(file name, bbox)`` pairs, bboxes in inches.
+        include: format string that includes a file, e.g.,
+                 ``'\\input{{{}.pgf}}'``.
+
+    Returns:
+        source, bbox: the LaTeX code and the bounding box of all panels.
+
+    Examples:
+        >>> from matplotlib.transforms import Bbox
+        >>> panels = [('a', Bbox([[0, 0], [1, 1]])),
+        ...           ('b', Bbox([[1, 0], [2, 1]]))]
+        >>> source, bbox = layout_source(panels, r'\input{{{}.pgf}}')
+        >>> print(source)
+        \begingroup%
+        \setlength{\unitlength}{1in}%
+        \begin{picture}(2.000000,1.000000)%
+        \put(0.000000,0.000000){\input{a.pgf}}%
+        \put(1.000000,0.000000){\input{b.pgf}}%
+        \end{picture}%
+        \endgroup%
+        <BLANKLINE>
+    """
+    union = Bbox.union([bbox for _, bbox in panels])
+    lines = [r'\begingroup%', r'\setlength{\unitlength}{1in}%',
+             r'\begin{{picture}}({:f},{:f})%'.format(union.width,
+                                                    union.height)]
+    for file_name, bbox in panels:
+        lines.append(r'\put({:f},{:f}){{{}}}%'.format(
+            bbox.x0 - union.x0, bbox.y0 - union.y0,
+            include.format(file_name)))
+    lines += [r'\end{picture}%', r'\endgroup%', '']
+    return '\n'.join(lines), union
+
+
+def pgf_layout_source(panels):
+    r"""Returns the LaTeX code of ``<name>.pgf``, see ``layout_source``.
+
+    TeX resolves ``\input`` relative to the main document, not to the file
+    that contains it. The panels are therefore included from the directory
+    of the layout file, given by ``\currfiledir`` when the document loads the
+    currfile package. Otherwise the names are left as they are, which works
+    with the import package (``\import{figures/}{fig.pgf}``) or when the
+    layout is in the directory of the main document.
+
+    Examples:
+        >>> from matplotlib.transforms import Bbox
+        >>> print(pgf_layout_source([('fig-panel1', Bbox([[0, 0], [1, 1]]))]))
+        \begingroup%
+        \ifdefined\currfiledir\edef\pubplotpaneldir{\currfiledir}%
+        \else\def\pubplotpaneldir{}\fi%
+        \setlength{\unitlength}{1in}%
+        \begin{picture}(1.000000,1.000000)%
+        \put(0.000000,0.000000){\input{\pubplotpaneldir fig-panel1.pgf}}%
+        \end{picture}%
+        \endgroup%
+        <BLANKLINE>
+    """
+    source, _ = layout_source(panels, r'\input{{\pubplotpaneldir {}.pgf}}')
+    return source.replace(r'\begingroup%', '\n'.join([
+        r'\begingroup%',
+        r'\ifdefined\currfiledir\edef\pubplotpaneldir{\currfiledir}%',
+        r'\else\def\pubplotpaneldir{}\fi%']), 1)
+
+
+def save_panels(fig, name, pdf=True, pgf=True, incremental=False,
+                workers=None):
+    """Implements ``PubFigure.save_panels``."""
+    from matplotlib.backends.backend_pgf import FigureCanvasPgf
+
+    formats = [ext for ext, enabled in (('pdf', pdf), ('pgf', pgf))
+               if enabled]
+    if not formats:
+        return []
+
+    saved = []
+    with rc_context(fig.rc.get_validated_rc('save')), text_cache(), \
+            temporary_directory() as temp_dir, \
+            ThreadPoolExecutor(workers) as executor:
+        texsystem = mpl.rcParams['pgf.texsystem']
+        renderer = FigureCanvasPgf(fig.fig).get_renderer()
+        with frozen_layout(fig.fig):
+            panels = panel_bboxes(fig.fig, renderer)
+            if not panels:
+                raise ValueError('the figure has no visible Axes')
+            # hashed before any panel is drawn, which modifies the artists
+            fingerprints = [fig.fingerprint(ax, extra=bbox.bounds)
+                            if incremental else None for ax, bbox in panels]
+
+            compiles = []
+            for i, (ax, bbox) in enumerate(panels):
+                panel = panel_name(name, i)
+                if incremental:
+                    if is_up_to_date(panel, fingerprints[i], formats):
+                        saved.append(False)
+                        continue
+                else:
+                    forget_fingerprint(panel)
+
+                if pgf:
+                    pgf_path = panel + '.pgf'
+                else:
+                    pgf_path = os.path.join(
+                        temp_dir, os.path.basename(panel) + '.pgf')
+                hidden = [a for a in fig.fig.get_children()
+                          if a is not ax and a is not fig.fig.patch and
+                          a.get_visible()]
+                for artist in hidden:
+                    artist.set_visible(False)
+                try:
+                    texsystem, preamble = fig._print_pgf(pgf_path, bbox)
+                finally:
+                    for artist in hidden:
+                        artist.set_visible(True)
+
+                # drawing is serial, LaTeX compiles panels concurrently
+                if pdf:
+                    compiles.append(executor.submit(
+                        get_pgf_compiler(texsystem, preamble).compile,
+                        pgf_path, panel + '.pdf'))
+                saved.append(True)
+
+        for future in compiles:
+            future.result()
+
+    if incremental:
+        for i, fingerprint in enumerate(fingerprints):
+            if saved[i]:
+                store_fingerprint(panel_name(name, i), fingerprint, formats)
+
+    files = [(os.path.basename(panel_name(name, i)), bbox)
+             for i, (_, bbox) in enumerate(panels)]
+    if pgf:
+        _write_if_changed(name + '.pgf', pgf_layout_source(files))
+    if pdf:
+        _save_layout_pdf(name, files, texsystem, any(saved) or not incremental)
+    return saved
+
+
+def _write_if_changed(path, text):
+    # unchanged files keep their modification time, so LaTeX builds that
+    # track them are not triggered
+    try:
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return
+    except (IOError, OSError):
+        pass
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def _save_layout_pdf(name, files, texsystem, panels_changed):
+    picture, bbox = layout_source(files, r'\includegraphics{{{}.pdf}}')
+    source = '\n'.join([
+        r'\documentclass[12pt]{minimal}',
+        r'\usepackage{graphicx}',
+        r'\usepackage[papersize={{{:f}in,{:f}in}}, margin=0in]{{geometry}}'
+        .format(bbox.width, bbox.height),
+        r'\begin{document}',
+        r'\noindent',
+        picture,
+        r'\end{document}',
+        '',
+    ])
+    fingerprint = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    if not panels_changed and is_up_to_date(name, fingerprint, ['pdf']):
+        return
+    compile_tex(source, name + '.pdf', texsystem,
+                os.path.dirname(os.path.abspath(name)),
+                'panel layout of ' + name)
+    store_fingerprint(name, fingerprint, ['pdf'])
@@ -0,0 +1,75 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# rasterization.py
+
+from matplotlib.collections import Collection
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+from matplotlib.spines import Spine
+
+from pubplot.decimation import DecimatedLine2D
+
+
+def artist_size(artist):
+    """Returns the number of vertices or elements (e.g., scatter markers)
+    drawn by an artist, or None if the artist is never rasterized
+    automatically.
+    """
+    if isinstance(artist, DecimatedLine2D):
+        return artist.drawn_size()
+    if isinstance(artist, Line2D):
+        return len(artist.get_xydata())
+    if isinstance(artist, Collection):
+        vertices = sum(len(path.vertices) for path in artist.get_paths())
+        return max(len(artist.get_offsets()), vertices)
+    if isinstance(artist, Patch) and not isinstance(artist, Spine):
+        return len(artist.get_path().vertices)
+    return None
+
+
+def heavy_artists(fig, threshold):
+    """Returns the data artists of a figure drawing more than ``threshold``
+    vertices or elements.
+
+    Only lines, collections and patches inside Axes are considered; text,
+    spines, ticks and the Axes background are never included.
+
+    Args:
+        fig: a matplotlib Figure.
+        threshold: maximum number of vertices or elements.
+
+    Returns:
+        A list of ``(artist, size)`` pairs.
+
+    Examples:
+        >>> from matplotlib.figure import Figure
+        >>> fig = Figure()
+        >>> ax = fig.add_subplot(1, 1, 1)
+        >>> _ = ax.plot(range(10))
+        >>> line, = ax.plot(range(1000))
+        >>> heavy_artists(fig, 100) == [(line, 1000)]
+        True
+    """
+    heavy = []
+    for ax in fig.axes:
+        for artist in ax.get_children():
+            if artist is ax.patch:
+                continue
+            size = artist_size(artist)
+            if size is not None and size > threshold:
+                heavy.append((artist, size))
+    return heavy
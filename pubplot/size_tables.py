@@ -0,0 +1,157 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# size_tables.py
+
+"""Precomputed sizes for the document classes in ``pubplot.document_classes``.
+
+Sizes for the bundled document classes do not change between runs, so they are
+shipped with pubplot instead of being measured with LaTeX every time. To
+regenerate the table on a machine with a full TeX installation run::
+
+    python -m pubplot.size_tables
+
+The table currently covers the IEEEtran conference and journal classes only.
+To list the bundled classes that are missing from the table or whose sizes
+differ from the ones LaTeX measures run::
+
+    python -m pubplot.size_tables --check
+
+Document classes missing from the table are measured with LaTeX as usual.
+"""
+
+from pprint import pformat
+import sys
+
+from pubplot import document_classes
+from pubplot.latex import document_class_key, get_document_sizes
+
+_IEEETRAN_10PT = {
+    'Huge': 24.0,
+    'LARGE': 17.0,
+    'Large': 14.0,
+    'caption': 8.0,
+    'columnwidth': 252.0,
+    'footnotesize': 8.0,
+    'huge': 20.0,
+    'large': 12.0,
+    'normalsize': 10.0,
+    'scriptsize': 7.0,
+    'small': 9.0,
+    'textwidth': 516.0,
+    'tiny': 5.0,
+}
+
+SIZE_TABLE = {
+    'ieee_infocom': _IEEETRAN_10PT,
+    'ieee_conf': _IEEETRAN_10PT,
+    'ieee_jrnl': _IEEETRAN_10PT,
+}
+
+_table_by_key = {}
+
+
+def get_precomputed_sizes(document_class):
+    """Returns the precomputed sizes for ``document_class``.
+
+    Document classes are matched by content, a dict equivalent to one of the
+    bundled document classes also uses the precomputed sizes.
+
+    Args:
+        document_class: dict with ``documentclass`` and ``document_options``.
+
+    Returns:
+        A dictionary with the same sizes returned by
+        ``pubplot.latex.get_document_sizes`` or None if ``document_class`` is
+        not in the table.
+
+    Examples:
+        >>> from pubplot.document_classes import ieee_infocom
+        >>> get_precomputed_sizes(ieee_infocom)['columnwidth']
+        252.0
+        >>> get_precomputed_sizes({'documentclass': 'letter'}) is None
+        True
+    """
+    if not _table_by_key:
+        for name, sizes in SIZE_TABLE.items():
+            key = document_class_key(getattr(document_classes, name))
+            _table_by_key[key] = sizes
+    sizes = _table_by_key.get(document_class_key(document_class))
+    if sizes is None:
+        return None
+    return dict(sizes)
+
+
+def build_size_table():
+    """Measures all bundled document classes with LaTeX.
+
+    Returns:
+        A dict mapping document class names to their sizes. Classes that LaTeX
+        could not measure are omitted.
+    """
+    table = {}
+    for name in sorted(dir(document_classes)):
+        document_class = getattr(document_classes, name)
+        if name.startswith('_') or not isinstance(document_class, dict):
+            continue
+        if 'documentclass' not in document_class:
+            continue
+        sizes = get_document_sizes(document_class, use_cache=False)
+        if sizes:
+            table[name] = sizes
+    return table
+
+
+def check_size_table(table):
+    """Compares measured sizes with ``SIZE_TABLE``.
+
+    Args:
+        table: sizes returned by ``build_size_table``.
+
+    Returns:
+        A list of messages, one per document class that is missing from
+        ``SIZE_TABLE`` or whose sizes differ, empty if the table is up to
+        date.
+
+    Examples:
+        >>> check_size_table({'ieee_conf': SIZE_TABLE['ieee_conf']})
+        []
+        >>> check_size_table({'usenix': {'columnwidth': 241.0}})
+        ['usenix: missing from SIZE_TABLE']
+    """
+    messages = []
+    for name, sizes in sorted(table.items()):
+        if name not in SIZE_TABLE:
+            messages.append('{}: missing from SIZE_TABLE'.format(name))
+        elif SIZE_TABLE[name] != sizes:
+            messages.append('{}: sizes differ, measured {}'.format(
+                name, sizes))
+    return messages
+
+
+def main(args):
+    table = build_size_table()
+    if args == ['--check']:
+        messages = check_size_table(table)
+        for message in messages:
+            print(message)
+        return 1 if messages else 0
+    print('SIZE_TABLE = ' + pformat(table))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -16,9 +16,8 @@
 #
 # styles.py
 
-import matplotlib as mpl
-import numpy as np
-from matplotlib import cycler
+# matplotlib and numpy are imported by the functions that need them, so that
+# importing styles is cheap.
 
 
 def dichromatic(color1='r', color2='k'):
@@ -33,6 +32,8 @@ def dichromatic(color1='r', color2='k'):
     Returns:
         dict: rcParams dict with the appropriate style
     """
+    from matplotlib import cycler
+
     return {
         # line styles
         'axes.prop_cycle': cycler('color', [color1] * 4 + [color2] * 4) +
@@ -71,6 +72,10 @@ def monochromatic(color='k'):
 
 
 def qualitative(markers=True):
+    import matplotlib as mpl
+    from matplotlib import cycler
+    import numpy as np
+
     cmap = mpl.cm.get_cmap('Set2')
     bins = np.linspace(0, 1, 8)
     palette = list(map(tuple, cmap(bins)[:, :3]))
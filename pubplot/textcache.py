@@ -0,0 +1,280 @@
+# coding=utf-8
+# ISC License
+# Copyright (c) 2017, Hugo Sadok
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+# ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+# WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+# ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+# OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+#
+# textcache.py
+
+from contextlib import contextmanager
+import functools
+import hashlib
+import os
+import threading
+import warnings
+
+from pubplot import cache
+from pubplot.latex import _engine_signature
+
+TEXT_CACHE_NAMESPACE = 'text-layout'
+
+# typical tick steps, labels are formatted for each step as matplotlib would
+TICK_STEPS = (0.1, 0.2, 0.25, 0.5, 1, 2, 2.5, 5, 10, 20, 25, 50, 100, 200,
+              250, 500)
+
+_layouts = {}  # (texsystem, latex header) -> TextLayoutCache
+_layouts_lock = threading.Lock()
+
+# the hook is installed while any thread is inside text_cache, and only
+# measures through the cache in those threads
+_hook_lock = threading.Lock()
+_hook_users = 0
+_hook_original = None
+_hook_state = threading.local()
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def text_cache_key(texsystem, latex_header):
+    """Returns the key identifying the text layouts produced by a LaTeX engine
+    with a given header (i.e., document class, preamble and fonts)."""
+    return _digest('{}|{}|{}'.format(texsystem, _engine_signature(texsystem),
+                                     latex_header))
+
+
+def text_layout_key(s, prop, ismath):
+    """Returns the key of a text measured by the pgf backend, i.e., the text
+    and the font properties LaTeX typesets it with.
+
+    Examples:
+        >>> from matplotlib.font_manager import FontProperties
+        >>> text_layout_key('42', FontProperties(family='serif', size=8),
+        ...                 False)
+        "42|False|['serif']|normal|normal|normal|normal|8.0"
+    """
+    return '|'.join(str(value) for value in (
+        s, ismath, prop.get_family(), prop.get_style(), prop.get_variant(),
+        prop.get_weight(), prop.get_stretch(), prop.get_size_in_points()))
+
+
+class TextLayoutCache(dict):
+    """LaTeX text metrics persisted in the pubplot cache.
+
+    Metrics measured by any process are reused by the others: reads are plain
+    file reads and every metric is written to its own file, atomically (see
+    ``pubplot.cache.store``), so concurrent processes need no locks. Metrics
+    are stored per unit of dpi, keyed by ``text_layout_key``.
+
+    Args:
+        key: the ``text_cache_key`` of the LaTeX engine and header.
+        entries: metrics already measured.
+
+    Attributes:
+        namespace: cache namespace holding the metrics.
+        typeset: number of metrics measured by LaTeX in this process.
+
+    Examples:
+        >>> import os
+        >>> import tempfile
+        >>> os.environ['PUBPLOT_CACHE_DIR'] = tempfile.mkdtemp()
+        >>> layouts = TextLayoutCache('example')
+        >>> layouts['42|False|serif'] = (0.1, 0.07, 0.0)
+        >>> '42|False|serif' in TextLayoutCache('example')
+        True
+        >>> del os.environ['PUBPLOT_CACHE_DIR']
+    """
+
+    def __init__(self, key, entries=()):
+        super(TextLayoutCache, self).__init__(entries)
+        self.namespace = os.path.join(TEXT_CACHE_NAMESPACE, key)
+        self.typeset = 0
+
+    def __contains__(self, text):
+        return (super(TextLayoutCache, self).__contains__(text) or
+                self._load(text) is not None)
+
+    def __getitem__(self, text):
+        try:
+            return super(TextLayoutCache, self).__getitem__(text)
+        except KeyError:
+            metrics = self._load(text)
+            if metrics is None:
+                raise
+            return metrics
+
+    def __setitem__(self, text, metrics):
+        super(TextLayoutCache, self).__setitem__(text, metrics)
+        self.typeset += 1
+        cache.store(self.namespace, _digest(text), list(metrics))
+
+    def _load(self, text):
+        metrics = cache.load(self.namespace, _digest(text))
+        if metrics is None:
+            return None
+        metrics = tuple(metrics)
+        super(TextLayoutCache, self).__setitem__(text, metrics)
+        return metrics
+
+
+def _current_layouts():
+    # TextLayoutCache of the engine and header of the current rcParams
+    import matplotlib as mpl
+    from matplotlib.backends.backend_pgf import LatexManager
+
+    key = mpl.rcParams['pgf.texsystem'], LatexManager._build_latex_header()
+    with _layouts_lock:
+        layouts = _layouts.get(key)
+        if layouts is None:
+            layouts = _layouts[key] = TextLayoutCache(text_cache_key(*key))
+    return layouts
+
+
+def _cached_text_metrics(get_text_width_height_descent):
+    # wraps RendererPgf.get_text_width_height_descent, which starts LaTeX
+    # (LatexManager) on its first call for a header, so that cached texts
+    # are measured without it
+    @functools.wraps(get_text_width_height_descent)
+    def wrapper(self, s, prop, ismath):
+        if not getattr(_hook_state, 'depth', 0):
+            return get_text_width_height_descent(self, s, prop, ismath)
+        layouts = _current_layouts()
+        key = text_layout_key(s, prop, ismath)
+        try:
+            metrics = layouts[key]
+        except KeyError:
+            metrics = get_text_width_height_descent(self, s, prop, ismath)
+            layouts[key] = [value / self.dpi for value in metrics]
+            return metrics
+        return tuple(value * self.dpi for value in metrics)
+
+    return wrapper
+
+
+def _install_hook(renderer_class):
+    global _hook_users, _hook_original
+    with _hook_lock:
+        if _hook_users == 0:
+            _hook_original = renderer_class.get_text_width_height_descent
+            renderer_class.get_text_width_height_descent = \
+                _cached_text_metrics(_hook_original)
+        _hook_users += 1
+
+
+def _uninstall_hook(renderer_class):
+    global _hook_users, _hook_original
+    with _hook_lock:
+        _hook_users -= 1
+        if _hook_users == 0:
+            renderer_class.get_text_width_height_descent = _hook_original
+            _hook_original = None
+
+
+@contextmanager
+def text_cache():
+    """Context manager that makes the pgf backend measure text through a
+    persistent ``TextLayoutCache`` in the current thread.
+
+    Text metrics are looked up before the pgf backend starts LaTeX to
+    measure them, so figures whose texts were all measured before, by any
+    process using the same engine and header, are laid out without waiting
+    for LaTeX. matplotlib 3.2 still checks the LaTeX setup once per process
+    and header when a pgf renderer is created, newer versions start LaTeX on
+    the first text that is not cached.
+
+    pubplot enters the context while it saves a figure. The pgf renderer is
+    only patched while some thread is inside the context, and pgf figures
+    drawn by other threads (e.g., not created by pubplot) are measured as
+    usual. A warning is issued if the installed matplotlib does not measure
+    text as expected.
+
+    Yields:
+        The TextLayoutCache of the current rcParams, or None if the cache is
+        disabled or cannot be installed.
+    """
+    if not cache.cache_enabled():
+        yield None
+        return
+    from matplotlib.backends.backend_pgf import LatexManager, RendererPgf
+
+    if (not hasattr(RendererPgf, 'get_text_width_height_descent') or
+            not hasattr(LatexManager, '_build_latex_header')):
+        warnings.warn('the text cache is not supported by this matplotlib '
+                      'version, texts are measured by LaTeX')
+        yield None
+        return
+
+    _install_hook(RendererPgf)
+    depth = getattr(_hook_state, 'depth', 0)
+    _hook_state.depth = depth + 1
+    try:
+        yield _current_layouts()
+    finally:
+        _hook_state.depth = depth
+        _uninstall_hook(RendererPgf)
+
+
+def tick_labels(step, start=-10, stop=20):
+    """Returns the tick labels matplotlib formats, with the current rcParams,
+    for ticks ``step`` apart from ``start * step`` to ``stop * step``.
+
+    Examples:
+        >>> import matplotlib as mpl
+        >>> with mpl.rc_context({'text.usetex': False}):
+        ...     tick_labels(0.5, start=0, stop=4)
+        ['0.0', '0.5', '1.0', '1.5', '2.0']
+    """
+    from matplotlib.ticker import ScalarFormatter
+
+    values = [i * step for i in range(start, stop + 1)]
+    formatter = ScalarFormatter()
+    formatter.create_dummy_axis()
+    formatter.axis.set_view_interval(values[0], values[-1])
+    formatter.set_locs(values)
+    return [formatter(v) for v in values]
+
+
+def default_texts():
+    """Returns the texts typical figures lay out: tick labels for common tick
+    steps and the string matplotlib uses to measure line heights."""
+    texts = ['lp']
+    for step in TICK_STEPS:
+        texts.extend(tick_labels(step))
+    return list(dict.fromkeys(texts))
+
+
+def prewarm_text_cache(texts, sizes):
+    """Measures texts at the given font sizes with the current rcParams, so
+    that figures do not wait for LaTeX to lay them out.
+
+    Args:
+        texts: strings as they appear in figures.
+        sizes: font sizes in pt.
+
+    Returns:
+        The TextLayoutCache, or None if metrics are only kept in memory for
+        this process (see ``text_cache``).
+    """
+    from matplotlib.backends.backend_pgf import FigureCanvasPgf
+    from matplotlib.figure import Figure
+    from matplotlib.font_manager import FontProperties
+
+    with text_cache() as layouts:
+        renderer = FigureCanvasPgf(Figure()).get_renderer()
+        for size in sizes:
+            prop = FontProperties(size=size)
+            for text in texts:
+                renderer.get_text_width_height_descent(text, prop,
+                                                       ismath=False)
+    return layouts
@@ -17,6 +17,7 @@ setup(
     author_email='hugo@sadok.com.br',
     keywords=['matplotlib', 'latex', 'pgf'],
     include_package_data=True,
+    python_requires='>=3.7',
     install_requires=[
         'matplotlib',
         'pylatex',
@@ -31,10 +32,8 @@ setup(
         'Natural Language :: English',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Topic :: Scientific/Engineering :: Visualization',
     ],
 )